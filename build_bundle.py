@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Builds an offline bundle for EOHC runs on machines without network:
+# a local repository with the packages required by all tests and the python
+# packages needed by start_gui.py. Use it with: ./start_gui.py --offline BUNDLE
+#
+import argparse
+import os
+import sys
+from core.release import TargetRelease, get_release, set_release
+from core.lib.registry import TestRegistry
+from core.lib.bundle import Bundle
+
+main_path = os.path.dirname(os.path.realpath(__file__))
+release = get_release()
+
+parser = argparse.ArgumentParser(description="Build an offline EOHC bundle")
+parser.add_argument("directory", help="directory of the bundle")
+parser.add_argument("--releasever", default=release.get_version_point_update(),
+                    help="EuroLinux release of the tested machine, e.g. 8.4 (default: %(default)s)")
+parser.add_argument("--arch", default=release.get_arch(),
+                    help="architecture of the tested machine (default: %(default)s)")
+parser.add_argument("--python-version", default=None,
+                    help="python version of the tested machine, e.g. 3.6 (default: this python)")
+arguments = parser.parse_args()
+
+# tests choose their packages by release (e.g. stress-ng from 8.6 on) - evaluate
+# them for the tested machine, not for this one
+if arguments.releasever != release.get_version_point_update() or arguments.arch != release.get_arch():
+    target = TargetRelease(arguments.releasever, arguments.arch, release.get_product() or "EuroLinux")
+    if not target.is_valid():
+        print("Error: %s is not a release version" % arguments.releasever)
+        sys.exit(1)
+    if target.update is None:
+        print("Warning: no minor release in %s, tests choosing packages by minor release assume %s.0"
+              % (arguments.releasever, arguments.releasever))
+    print("Evaluating tests for release %s %s" % (target.get_version_point_update(), target.get_arch()))
+    set_release(target)
+
+# union of the packages required by all tests
+registry = TestRegistry(main_path)
+rpms = set()
+for name in registry.get_names():
+    info = registry.get_info(name)
+    if info["required_rpms"] is not None:
+        rpms.update(info["required_rpms"])
+        continue
+    # package list depends on the release or hardware, ask the test itself (hardware
+    # dependent lists describe this machine)
+    try:
+        rpms.update(registry.load(name).get_required_rpms())
+    except ImportError as e:
+        print("Warning: could not import %s, its packages are not in the bundle" % info["import_path"])
+        print(e)
+rpms.discard("")
+
+bundle = Bundle(arguments.directory)
+if not bundle.build(rpms, arguments.releasever, arguments.arch, arguments.python_version):
+    sys.exit(1)
+print("Bundle is ready: %s" % bundle.directory)
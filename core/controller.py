@@ -4,8 +4,11 @@
 
 import os
 import errno
+import json
+import mmap
 import re
 import subprocess
+import syslog
 import time
 
 from core.lib.compatability import rhcert_make_unicode
@@ -13,11 +16,15 @@ from core.lib.compatability import rhcert_make_unicode
 
 
 class Controller(object):
+    # syslog path -> (st_dev, st_ino, scanned size, offset of the last boot)
+    syslog_index = dict()
 
     def __init__(self, echoResponses=True):
         # self.ui = TestUI(echoResponses)
         self.system_log_marker = "rhcert/runtests"
         self.system_log_boot_marker = "Linux version"
+        self.system_log_cursors = dict() # marker name -> journal cursor
+        self.syslog_path = "/var/log/messages"
 
     def remove_directory(self, directory):
         "Remove a directory (and all its contents)"
@@ -56,70 +63,195 @@ class Controller(object):
     def get_system_log_open(self):
         return self.system_log_marker+"[%s]" % os.getpid()
 
-    def get_system_log(self, marker_name, pid=True):
+    def mark_system_log(self, marker_name, mark, pid=True):
+        """Write a marker into the system log. On a "begin" mark the current
+        journal cursor is remembered, so get_system_log() later reads only the
+        entries written after it instead of the whole boot."""
+        if mark == "begin":
+            cursor = self.get_system_log_cursor()
+            if cursor:
+                self.system_log_cursors[marker_name] = cursor
+        syslog.syslog(self.get_system_log_marker(marker_name, mark, pid))
+
+    def get_system_log_cursor(self):
+        "Return the cursor of the newest journal entry or None"
+        try:
+            journal = subprocess.Popen(['journalctl', '-q', '-n', '1', '-o', 'json'],
+                                       stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            output = journal.communicate()[0]
+        except OSError:
+            return None
+        for line in output.splitlines():
+            try:
+                return json.loads(line.decode('utf-8', 'replace')).get('__CURSOR')
+            except ValueError:
+                continue
+        return None
+
+    def get_system_log(self, marker_name, pid=True, cursor=None):
         "Get a named section of the system log"
 
-        log = self.get_system_log_since_boot()
         begin_mark = self.get_system_log_marker(marker_name, "begin", pid)
         end_mark = self.get_system_log_marker(marker_name, "end", pid)
+        if not cursor:
+            cursor = self.system_log_cursors.get(marker_name)
         contents = []
-        logiter = iter(log)
-        for l in logiter:
-            if begin_mark in l:
-                contents.append(l)
-                break
-        for l in logiter:
-            contents.append(l)
-            if end_mark in l:
-                break
+        if cursor:
+            contents = self.__read_marked_section(
+                self.iter_system_log_after_cursor(cursor), begin_mark, end_mark)
+        if not contents:
+            # no cursor, or the cursor is gone (e.g. volatile journal after reboot)
+            journal = self.__open_journal(['-b0'])
+            if not journal:
+                # If journalctl does not exist, search the syslog file directly.
+                return self.__read_syslog_section(begin_mark, end_mark)
+            contents = self.__read_marked_section(
+                self.__iter_journal(journal), begin_mark, end_mark)
         return ''.join(contents)
 
-    def get_system_log_since_boot(self):
+    def __read_marked_section(self, log, begin_mark, end_mark):
+        contents = []
         try:
-            # Got logs for current boot
-            try:  # python2
-                contents = []
-                log = subprocess.Popen(
-                    ['journalctl', '-b0'], stdout=subprocess.PIPE).communicate()[0]
-                for l in log.split('\n'):
-                    try:
-                        contents.append(l.decode('utf-8') + '\n')
-                    except UnicodeDecodeError as error:
-                        print(error)
-                return contents
-            except TypeError:  # python3
-                log = subprocess.Popen(
-                    ['journalctl', '-b0'], stdout=subprocess.PIPE, encoding='utf8').communicate()[0]
-                return log.split('\n')
-        except OSError:
-            # If journalctl does not exist, fall back to normal log reading.
-            pass
-        except subprocess.CalledProcessError:
-            # Try syslog if journalctl returns an error.
-            pass
-
-        syslog = '/var/log/messages'
-        log = open(syslog)
-        contents = list()
-        marker = False
-        for l in log:
-            try:
-                try:  # python2
-                    l = l.decode("utf-8")
-                except AttributeError:
-                    pass  # python3 already unicode
-                if l.find("kernel:") != -1 and l.find(self.system_log_boot_marker) != -1:
-                    marker = True
-                    # dump old contents
-                    contents = list()
-                if marker:
+            for l in log:
+                if begin_mark in l:
                     contents.append(l)
-            except UnicodeDecodeError:
-                # if we can't decode it, skip the whole line
-                continue
-        log.close()
+                    break
+            for l in log:
+                contents.append(l)
+                if end_mark in l:
+                    break
+        finally:
+            # stops journalctl if we did not read everything
+            log.close()
         return contents
 
+    def get_system_log_since_boot(self):
+        return list(self.iter_system_log_since_boot())
+
+    def iter_system_log_since_boot(self):
+        "Yield the system log lines of the current boot, one at a time"
+        journal = self.__open_journal(['-b0'])
+        if journal:
+            return self.__iter_journal(journal)
+        # If journalctl does not exist, fall back to normal log reading.
+        return self.__iter_syslog_since_boot()
+
+    def iter_system_log_after_cursor(self, cursor):
+        "Yield the system log lines written after the given journal cursor"
+        journal = self.__open_journal(['--after-cursor', cursor])
+        if journal:
+            return self.__iter_journal(journal)
+        return (l for l in [])
+
+    def __open_journal(self, arguments):
+        try:
+            return subprocess.Popen(['journalctl', '-q', '--no-pager', '-o', 'json'] + arguments,
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError:
+            return None
+
+    def __iter_journal(self, journal):
+        try:
+            for line in journal.stdout:
+                try:
+                    entry = json.loads(line.decode('utf-8', 'replace'))
+                except ValueError:
+                    continue
+                yield self.format_journal_entry(entry)
+        finally:
+            if journal.poll() is None:
+                journal.kill()
+            journal.stdout.close()
+            journal.wait()
+
+    def format_journal_entry(self, entry):
+        """Format a journal JSON entry like the default 'short' output:
+        <date> <host> <identifier>[<pid>]: <message>"""
+        message = entry.get('MESSAGE') or ''
+        if isinstance(message, list):
+            # non-UTF-8 messages are exported as a list of bytes
+            message = bytes(message).decode('utf-8', 'replace')
+        identifier = entry.get('SYSLOG_IDENTIFIER') or entry.get('_COMM') or ''
+        pid = entry.get('SYSLOG_PID') or entry.get('_PID')
+        if pid and identifier != 'kernel':
+            identifier = "%s[%s]" % (identifier, pid)
+        try:
+            timestamp = time.strftime("%b %d %H:%M:%S",
+                                      time.localtime(int(entry['__REALTIME_TIMESTAMP']) / 1000000))
+        except (KeyError, ValueError):
+            timestamp = ''
+        return "%s %s %s: %s\n" % (timestamp, entry.get('_HOSTNAME', ''), identifier, message)
+
+    def __iter_syslog_since_boot(self):
+        syslog_map = self.__map_syslog()
+        if syslog_map is None:
+            return
+        try:
+            syslog_map.seek(self.__find_syslog_boot_offset(syslog_map))
+            for l in iter(syslog_map.readline, b""):
+                try:
+                    yield l.decode("utf-8")
+                except UnicodeDecodeError:
+                    # if we can't decode it, skip the whole line
+                    continue
+        finally:
+            syslog_map.close()
+
+    def __read_syslog_section(self, begin_mark, end_mark):
+        "Find the marked section of the current boot in the syslog file"
+        syslog_map = self.__map_syslog()
+        if syslog_map is None:
+            return ""
+        try:
+            begin = syslog_map.find(begin_mark.encode("utf-8"),
+                                    self.__find_syslog_boot_offset(syslog_map))
+            if begin == -1:
+                return ""
+            begin = syslog_map.rfind(b"\n", 0, begin) + 1
+            end = syslog_map.find(end_mark.encode("utf-8"), begin)
+            if end == -1:
+                end = len(syslog_map)
+            else:
+                end = syslog_map.find(b"\n", end)
+                end = len(syslog_map) if end == -1 else end + 1
+            return syslog_map[begin:end].decode("utf-8", "replace")
+        finally:
+            syslog_map.close()
+
+    def __map_syslog(self):
+        try:
+            with open(self.syslog_path, "rb") as log:
+                return mmap.mmap(log.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # missing or empty file
+            return None
+
+    def __find_syslog_boot_offset(self, syslog_map):
+        """Return the offset of the last kernel boot line in the syslog file.
+        The offset is indexed per file; as long as the inode is the same and
+        the file did not shrink only the newly appended part is searched."""
+        stat = os.stat(self.syslog_path)
+        size = len(syslog_map)
+        (dev, inode, scanned, offset) = Controller.syslog_index.get(self.syslog_path, (None, None, 0, 0))
+        if (dev, inode) != (stat.st_dev, stat.st_ino) or size < scanned:
+            # new or rotated file
+            scanned = offset = 0
+        boot_marker = self.system_log_boot_marker.encode("utf-8")
+        start = max(0, scanned - len(boot_marker))
+        end = size
+        while True:
+            # search backwards from EOF, stop at the part we already know
+            found = syslog_map.rfind(boot_marker, start, end)
+            if found == -1:
+                break
+            line_start = syslog_map.rfind(b"\n", 0, found) + 1
+            if syslog_map.find(b"kernel:", line_start, found) != -1:
+                offset = line_start
+                break
+            end = found
+        Controller.syslog_index[self.syslog_path] = (stat.st_dev, stat.st_ino, size, offset)
+        return offset
+
     # def release(self):
     #     return self.ui.release()
 
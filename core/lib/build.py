@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Parallel, cached builds of the helper binaries of tests (tests/<name>/Makefile)
+#
+
+import glob, hashlib, json, os, subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+STAMP_FILE = ".eohc_build"
+SOURCE_PATTERNS = ["Makefile", "*.c", "*.h", "*.cpp", "*.hpp", "*.S"]
+
+
+def get_compiler_version():
+    """ returns the first line of "gcc --version" or None if there is no gcc """
+    (status, output) = subprocess.getstatusoutput("gcc --version")
+    if status != 0:
+        return None
+    return output.split("\n")[0]
+
+
+def get_sources(directory):
+    files = set()
+    for pattern in SOURCE_PATTERNS:
+        files.update(glob.glob(os.path.join(directory, pattern)))
+    return sorted(files)
+
+
+def get_file_states(directory, skip):
+    """ returns {file name: (inode, mtime in ns, size)} of the files in directory but skip """
+    states = dict()
+    for file in os.listdir(directory):
+        if file in skip:
+            continue
+        try:
+            state = os.stat(os.path.join(directory, file))
+        except OSError:
+            continue
+        if os.path.isfile(os.path.join(directory, file)):
+            states[file] = (state.st_ino, state.st_mtime_ns, state.st_size)
+    return states
+
+
+def get_source_hash(directory, compiler):
+    """ sha256 of the compiler version, architecture and build sources in directory """
+    source_hash = hashlib.sha256()
+    source_hash.update(("%s %s\n" % (compiler, os.uname().machine)).encode("utf-8"))
+    for file in get_sources(directory):
+        source_hash.update(os.path.basename(file).encode("utf-8") + b"\0")
+        with open(file, "rb") as source:
+            source_hash.update(source.read())
+    return source_hash.hexdigest()
+
+
+class HelperBuilder:
+    """ builds the Makefiles of tests in parallel. A build is cached in a stamp
+    file next to the Makefile, holding the hash of its sources and compiler
+    version and the files it produced - unchanged helpers are never rebuilt """
+
+    def __init__(self, main_path, jobs=None):
+        self.main_path = main_path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.compiler = None
+
+    def get_directories(self, names):
+        """ returns {test name: directory} of the given tests having a Makefile """
+        directories = dict()
+        for name in names:
+            directory = os.path.join(self.main_path, "tests", name)
+            if os.path.isfile(os.path.join(directory, "Makefile")):
+                directories[name] = directory
+        return directories
+
+    def load_stamp(self, directory):
+        try:
+            stamp_file = open(os.path.join(directory, STAMP_FILE))
+            stamp = json.load(stamp_file)
+            stamp_file.close()
+        except (IOError, OSError, ValueError):
+            return dict()
+        return stamp
+
+    def is_cached(self, directory, source_hash):
+        stamp = self.load_stamp(directory)
+        if stamp.get("hash") != source_hash:
+            return False
+        for file in stamp.get("outputs", list()):
+            if not os.path.exists(os.path.join(directory, file)):
+                return False
+        return True
+
+    def build_one(self, directory):
+        """ returns (status, output) where status is "cached", "built" or "failed" """
+        source_hash = get_source_hash(directory, self.compiler)
+        if self.is_cached(directory, source_hash):
+            return ("cached", "")
+        # timestamps are too coarse on some file systems (NFS, FAT) to tell fresh files,
+        # so outputs are the files make created or changed, and those of the last build
+        skip = [STAMP_FILE] + [os.path.basename(file) for file in get_sources(directory)]
+        before = get_file_states(directory, skip)
+        previous = self.load_stamp(directory).get("outputs", list())
+        # the sources changed, so the old outputs must not be trusted by make
+        (status, output) = subprocess.getstatusoutput("make -B -C %s" % directory)
+        if status != 0:
+            try:
+                os.remove(os.path.join(directory, STAMP_FILE))
+            except OSError:
+                pass
+            return ("failed", output)
+        # files written by make are the outputs which must exist for a cache hit
+        outputs = list()
+        for (file, state) in get_file_states(directory, skip).items():
+            if before.get(file) != state or file in previous:
+                outputs.append(file)
+        stamp_file = open(os.path.join(directory, STAMP_FILE), "w")
+        json.dump({"hash": source_hash, "compiler": self.compiler, "outputs": sorted(outputs)}, stamp_file)
+        stamp_file.close()
+        return ("built", output)
+
+    def build(self, names):
+        """ builds the helpers of the given tests in parallel
+        returns {test name: (status, output)} """
+        directories = self.get_directories(names)
+        if not directories:
+            return dict()
+        self.compiler = get_compiler_version()
+        if not self.compiler:
+            return {name: ("failed", "There is no gcc") for name in directories}
+        results = dict()
+        with ThreadPoolExecutor(max_workers=min(self.jobs, len(directories))) as executor:
+            futures = {name: executor.submit(self.build_one, directory) for (name, directory) in directories.items()}
+            for (name, future) in futures.items():
+                try:
+                    results[name] = future.result()
+                except (IOError, OSError) as e:
+                    results[name] = ("failed", str(e))
+        return results
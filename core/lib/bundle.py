@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Offline bundle: local rpm repository and python wheels for runs without network
+#
+
+import json, os, subprocess
+from core.lib.packages import download_packages, create_repository
+
+# packages needed by start_gui.py itself, before any test is selected
+BOOTSTRAP_RPMS = ["python3-pip", "gcc", "make"]
+BOOTSTRAP_WHEELS = ["inquirer"]
+
+
+class Bundle:
+    """ directory with a local rpm repository (repo/), python wheels (wheels/)
+    and a manifest (bundle.json) describing what they were built for """
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.repository = os.path.join(self.directory, "repo")
+        self.wheels = os.path.join(self.directory, "wheels")
+        self.manifest_path = os.path.join(self.directory, "bundle.json")
+
+    def build(self, rpms, releasever, arch, python_version=None):
+        """ downloads rpms (plus BOOTSTRAP_RPMS) with all dependencies and the
+        BOOTSTRAP_WHEELS, returns True if the bundle is complete """
+        for directory in [self.repository, self.wheels]:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+        rpms = sorted(set(rpms) | set(BOOTSTRAP_RPMS))
+        print("Downloading packages: %s" % " ".join(rpms))
+        (status, output) = download_packages(rpms, self.repository, releasever, arch)
+        if status != 0:
+            print("Error: could not download packages")
+            print(output)
+            return False
+        (status, output) = create_repository(self.repository)
+        if status != 0:
+            print("Error: could not create repository")
+            print(output)
+            return False
+        print("Downloading python packages: %s" % " ".join(BOOTSTRAP_WHEELS))
+        options = "-d %s" % self.wheels
+        if python_version:
+            options += " --only-binary=:all: --python-version %s" % python_version
+        (status, output) = subprocess.getstatusoutput("pip download %s %s" % (options, " ".join(BOOTSTRAP_WHEELS)))
+        if status != 0:
+            print("Error: could not download python packages")
+            print(output)
+            return False
+        manifest = {"releasever": str(releasever), "arch": arch, "python_version": python_version,
+                    "rpms": rpms, "wheels": BOOTSTRAP_WHEELS}
+        manifest_file = open(self.manifest_path, "w")
+        json.dump(manifest, manifest_file, indent=1)
+        manifest_file.close()
+        return True
+
+    def load_manifest(self):
+        try:
+            manifest_file = open(self.manifest_path)
+            manifest = json.load(manifest_file)
+            manifest_file.close()
+            return manifest
+        except (IOError, OSError, ValueError):
+            return None
+
+    def check(self, release):
+        """ returns True if the bundle was built for the major release and
+        architecture of the given EuroLinuxRelease, a different minor release
+        is only a warning """
+        manifest = self.load_manifest()
+        if not manifest:
+            print("Error: %s is not an EOHC bundle (no bundle.json)" % self.directory)
+            return False
+        if str(release.get_version()) != manifest["releasever"].split(".")[0] or release.get_arch() != manifest["arch"]:
+            print("Error: bundle was built for release %s %s, this system is %s %s"
+                  % (manifest["releasever"], manifest["arch"], release.get_version_point_update(), release.get_arch()))
+            return False
+        if "." in manifest["releasever"] and manifest["releasever"] != release.get_version_point_update():
+            print("Warning: bundle was built for release %s, this system is %s - packages of some tests may differ"
+                  % (manifest["releasever"], release.get_version_point_update()))
+        return True
+
+    def install_wheels(self):
+        """ installs BOOTSTRAP_WHEELS from the bundle only, returns (status, output) """
+        return subprocess.getstatusoutput("sudo pip install --no-index --find-links %s %s"
+                                          % (self.wheels, " ".join(BOOTSTRAP_WHEELS)))
@@ -19,7 +19,45 @@ import sys, readline
 #         sys.stdout.flush()
 #     return response
 
+# answers of unattended runs: {part of the question: answer}, see set_answers()
+_answers = None
+
+class NoAnswerError(EOFError):
+    """ question asked in an unattended run which the answer file does not answer """
+
+def set_answers(answers):
+    """ answer the questions without a terminal from now on. The longest key
+    found in a question selects its answer; a list answers repeated questions
+    in order and its last value is kept for the next ones """
+    global _answers
+    _answers = dict()
+    for (key, answer) in answers.items():
+        if isinstance(answer, list):
+            answer = list(answer)
+        _answers[key] = answer
+
+def get_answer(message):
+    """ returns the answer file answer for the question, None in interactive runs """
+    if _answers is None:
+        return None
+    keys = [key for key in _answers if key in message]
+    if not keys:
+        print(message)
+        raise NoAnswerError("No answer for the question: %s" % message.strip())
+    key = max(keys, key=len)
+    answer = _answers[key]
+    if isinstance(answer, list):
+        if len(answer) > 1:
+            answer = _answers[key].pop(0)
+        else:
+            answer = answer[0]
+    print("%s%s" % (message, answer))
+    return answer
+
 def select(message, answers, selected=None):
+    answer = get_answer(message)
+    if answer is not None:
+        return str(answer)
     if not selected:
         selected = ""
     while True:
@@ -50,6 +88,10 @@ def prompt(message, validation=None, default=None, answers=None):
     if answers:
         return select(message, answers)
 
+    answer = get_answer(message)
+    if answer is not None:
+        return str(answer)
+
     defaultValue = ""
     if default:
         defaultValue = default
@@ -79,6 +121,9 @@ def prompt_confirm(message):
     SAMEASNO = ["n", "no", "na", "nada" "negative", "negatory", "stop", "n", "nie",
                 "never", "nooooo!", "no way", "non", "nein", "nicht", "0", "false"]
     message += " (%s|%s) " % (YES, NO)
+    answer = get_answer(message)
+    if answer is not None:
+        return answer is True or str(answer).lower() in SAMEASYES
     while True:
         answer = prompt(message)
         if answer.lower() in SAMEASYES:
@@ -139,6 +184,9 @@ def prompt_confirm(message):
 #     return True
 
 def prompt_integer(message, default=None):
+    answer = get_answer(message)
+    if answer is not None:
+        return int(answer)
     while True:
         sys.stdout.write(message)
         sys.stdout.flush()
@@ -2,8 +2,8 @@
 # Author: Radoslaw Kolba
 #
 
-import os, time, syslog, subprocess, datetime
-from core.release import EuroLinuxRelease
+import os, re, time, subprocess, datetime
+from core.release import get_release
 from core.controller import Controller
 
 class Continuation(Controller):
@@ -13,10 +13,16 @@ class Continuation(Controller):
         self.method = None
         self.timestamp = None
         self.kernel = None
+        self.cursor = None
         self.bootPrintPath = "/bootprint"
-        self.release = EuroLinuxRelease()
+        self.duration = None
+        self.unitName = "eohc-reboot.service"
+        self.unitPath = "/etc/systemd/system/" + self.unitName
+        self.fpdtPath = "/sys/firmware/acpi/fpdt/boot"
+        self.release = get_release()
 
-    def set_init_config(self, marker, method=None):
+    def set_init_config(self, marker, method=None, command=None):
+        """ command is run from a systemd unit after the next boot """
         if self.release.get_version() < 7:
             pass
         else:
@@ -26,30 +32,91 @@ class Continuation(Controller):
         if self.release.get_version() < 7:
             chkconfig = subprocess.getoutput("chkconfig --add rhcertd")
             print(chkconfig)
-        else:
-            print(subprocess.getoutput("systemctl enable rhcertd"))
-            print(subprocess.getoutput("systemctl daemon-reload"))
+        elif command:
+            self.install_boot_unit(command)
         # get a timestamo, save it
         self.timestamp = datetime.datetime.now()
-        # save it off to the side
+        # mark the log with this run time
+        markerName = "%s-%s" % (marker, self.timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+        self.mark_system_log(markerName, "begin", pid=False)
+        # save it off to the side, with the journal cursor so that the log
+        # can be read from the marker on after reboot
         timestamp = open(self.bootPrintPath, "w")
         timestamp.write(self.timestamp.strftime("%Y-%m-%d %H:%M:%S") + "\n")
         if self.method:
             timestamp.write(self.method + "\n")
             timestamp.write(self.release.get_kernel() + "\n")
+            timestamp.write(self.system_log_cursors.get(markerName, "") + "\n")
         timestamp.close()
-        # mark the log with this run time
-        markerName = "%s-%s" % (marker, self.timestamp.strftime("%Y-%m-%d %H:%M:%S"))
-        syslog.syslog(self.get_system_log_marker(markerName, "begin", pid=False))
+
+    def install_boot_unit(self, command):
+        """ run command once the system is up, in the current directory.
+        Type=simple, so the unit does not hold up "Startup finished" which
+        the command may wait for """
+        unit = open(self.unitPath, "w")
+        unit.write("[Unit]\n")
+        unit.write("Description=EOHC reboot test continuation\n")
+        unit.write("After=multi-user.target\n\n")
+        unit.write("[Service]\n")
+        unit.write("Type=simple\n")
+        unit.write("WorkingDirectory=%s\n" % os.getcwd())
+        unit.write("ExecStart=%s\n\n" % command)
+        unit.write("[Install]\n")
+        unit.write("WantedBy=multi-user.target\n")
+        unit.close()
+        print(subprocess.getoutput("systemctl daemon-reload"))
+        print(subprocess.getoutput("systemctl enable %s" % self.unitName))
 
     def removeInitConfig(self):
         if self.release.get_version() < 7:
             chkconfig = subprocess.getoutput("chkconfig --del rhcertd")
-            chkconfig.echo()
-        else:
-            print(subprocess.getoutput("systemctl disable rhcertd"))
+            print(chkconfig)
+        elif os.path.isfile(self.unitPath):
+            print(subprocess.getoutput("systemctl disable %s" % self.unitName))
+            os.remove(self.unitPath)
             print(subprocess.getoutput("systemctl daemon-reload"))
 
+    def get_boot_times(self, timeout=300):
+        """ returns the boot phase times of this boot in seconds, from
+        systemd-analyze (firmware, loader, kernel, initrd, userspace) and
+        the ACPI firmware performance data table where present """
+        times = dict()
+        slept = 0
+        while True:
+            (status, output) = subprocess.getstatusoutput("systemd-analyze time")
+            if status == 0 or slept >= timeout:
+                break
+            # "Bootup is not yet finished"
+            time.sleep(5)
+            slept += 5
+        # Startup finished in 4.1s (firmware) + 2.3s (loader) + 1.2s (kernel) + 1min 2.5s (userspace) = 1min 10.1s
+        match = re.search("Startup finished in (?P<phases>.*) = ", output)
+        if match:
+            for phase in match.group("phases").split(" + "):
+                phase_match = re.match("(?P<value>.+) \\((?P<name>\\w+)\\)$", phase.strip())
+                if phase_match:
+                    times[phase_match.group("name")] = self.parse_systemd_time(phase_match.group("value"))
+        else:
+            print("Warning: could not get boot times from systemd-analyze")
+            print(output)
+        try:
+            fpdt = dict()
+            for name in ["bootloader_launch_ns", "exitbootservice_end_ns"]:
+                fpdt[name] = int(open(os.path.join(self.fpdtPath, name)).read().strip())
+            times["fpdt firmware"] = fpdt["bootloader_launch_ns"] / 1e9
+            times["fpdt loader"] = (fpdt["exitbootservice_end_ns"] - fpdt["bootloader_launch_ns"]) / 1e9
+        except (OSError, IOError, ValueError):
+            pass
+        return times
+
+    def parse_systemd_time(self, value):
+        """ "1min 2.345s" -> 62.345 """
+        units = {"h": 3600, "min": 60, "s": 1, "ms": 0.001, "us": 0.000001}
+        seconds = 0.0
+        for (number, unit) in re.findall("([\\d\\.]+)(h|min|ms|us|s)", value):
+            seconds += float(number) * units[unit]
+        return seconds
+
     def isInitialized(self):
         return os.path.isfile(self.bootPrintPath)
 
@@ -66,10 +133,14 @@ class Continuation(Controller):
                 kernel = timestamp.readline()
                 if kernel:
                     self.kernel = kernel.strip()
+                    cursor = timestamp.readline()
+                    if cursor.strip():
+                        self.cursor = cursor.strip()
             timestamp.close()
             os.remove(self.bootPrintPath)
 
             duration = datetime.datetime.now() - self.timestamp
+            self.duration = duration.total_seconds()
             print("reboot took " + str(duration))
             print("method: " + self.method)
             print("kernel: " + self.kernel)
@@ -88,7 +159,7 @@ class Continuation(Controller):
                 print("    after:  " + kernel)
                 return False
 
-            log = self.get_system_log("%s-%s" % (marker, timestamp_str), pid=False)
+            log = self.get_system_log("%s-%s" % (marker, timestamp_str), pid=False, cursor=self.cursor)
             reboot_count = 0
 
             for line in log.split('\n'):
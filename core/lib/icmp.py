@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# ICMP echo prober - per-packet round trips, loss bursts and reordering,
+# stops once the loss rate is known well enough
+#
+
+import math, os, select, socket, struct, time
+
+from core.lib.latency import LatencyResult
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+def get_checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack("!%uH" % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def get_loss_interval(lost, sent, z=1.96):
+    """ returns the (lower, upper) Wilson score interval of the loss rate in percent, 95% by default """
+    if not sent:
+        return (0.0, 100.0)
+    rate = float(lost) / sent
+    denominator = 1 + z * z / sent
+    center = (rate + z * z / (2 * sent)) / denominator
+    spread = z * math.sqrt(rate * (1 - rate) / sent + z * z / (4 * sent * sent)) / denominator
+    return (max(0.0, center - spread) * 100, min(1.0, center + spread) * 100)
+
+
+class IcmpResult:
+    """ result of one probe run """
+
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.lost = list() # sequence numbers
+        self.rtts = list() # microseconds, in order of arrival
+        self.stopped_early = False
+
+    def get_loss(self):
+        if not self.sent:
+            return 0.0
+        return len(self.lost) * 100.0 / self.sent
+
+    def get_bursts(self):
+        """ returns lengths of the runs of consecutive lost packets """
+        bursts = list()
+        previous = None
+        for sequence in sorted(self.lost):
+            if previous is not None and sequence == previous + 1:
+                bursts[-1] += 1
+            else:
+                bursts.append(1)
+            previous = sequence
+        return bursts
+
+    def print_report(self, target):
+        latency = LatencyResult(self.rtts, len(self.lost))
+        print("%u packets sent to %s, %u received, %.2f%% packet loss%s" % (
+            self.sent, target, self.received, self.get_loss(), ", stopped early" if self.stopped_early else ""))
+        if self.rtts:
+            mean = latency.get_mean()
+            deviation = math.sqrt(sum((rtt - mean) ** 2 for rtt in self.rtts) / len(self.rtts))
+            print("rtt min/avg/max/mdev = %.3f/%.3f/%.3f/%.3f ms" % (
+                latency.sorted[0] / 1000, mean / 1000, latency.sorted[-1] / 1000, deviation / 1000))
+        bursts = self.get_bursts()
+        if bursts:
+            print("%u loss bursts, longest %u packets" % (len(bursts), max(bursts)))
+        if self.reordered or self.duplicates:
+            print("%u reordered, %u duplicate replies" % (self.reordered, self.duplicates))
+        latency.print_report("ICMP echo")
+
+
+class IcmpProber:
+    """ sends up to count ICMP echo requests, window of them at a time, and
+    collects their replies. Uses an unprivileged ICMP datagram socket if
+    net.ipv4.ping_group_range allows it, a raw socket otherwise (root).
+    Every check_every packets the loss rate interval is checked: the run stops
+    once it is below good_loss or above bad_loss (percent) """
+
+    def __init__(self, target, count=5000, window=4, timeout=1.0, size=56,
+                 good_loss=None, bad_loss=None, minimum=500, check_every=100, source=None):
+        self.target = socket.gethostbyname(target)
+        self.count = count
+        self.window = window
+        self.timeout = timeout
+        self.size = size
+        self.good_loss = good_loss
+        self.bad_loss = bad_loss
+        self.minimum = minimum
+        self.check_every = check_every
+        self.source = source
+        self.identifier = os.getpid() & 0xffff
+        self.raw = False
+
+    def open(self):
+        """ raises OSError if no ICMP socket is allowed """
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except OSError:
+            self.raw = True
+            return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+
+    def get_packet(self, sequence):
+        payload = b"\x5a" * self.size
+        header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, self.identifier, sequence & 0xffff)
+        checksum = get_checksum(header + payload)
+        return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, self.identifier, sequence & 0xffff) + payload
+
+    def parse_reply(self, data):
+        """ returns the sequence number of an echo reply to us or None """
+        if self.raw:
+            data = data[(data[0] & 0x0f) * 4:]
+        if len(data) < 8:
+            return None
+        (kind, code, checksum, identifier, sequence) = struct.unpack("!BBHHH", data[:8])
+        if kind != ICMP_ECHO_REPLY:
+            return None
+        # datagram sockets get replies of their own only, the kernel sets the identifier
+        if self.raw and identifier != self.identifier:
+            return None
+        return sequence
+
+    def is_decided(self, result, done):
+        """ is the loss rate of done packets (answered or lost) surely below good_loss or above bad_loss """
+        if done < self.minimum:
+            return False
+        (lower, upper) = get_loss_interval(len(result.lost), done)
+        if self.good_loss is not None and upper < self.good_loss:
+            return True
+        if self.bad_loss is not None and lower > self.bad_loss:
+            return True
+        return False
+
+    def run(self):
+        """ returns IcmpResult, raises OSError if the ICMP socket can not be opened """
+        result = IcmpResult()
+        connection = self.open()
+        if self.source:
+            connection.bind((self.source, 0))
+        outstanding = dict() # sequence & 0xffff: (sequence, send time)
+        answered = set()
+        highest = -1
+        last_checked = -1
+        try:
+            while result.sent < self.count or outstanding:
+                while result.sent < self.count and len(outstanding) < self.window and not result.stopped_early:
+                    outstanding[result.sent & 0xffff] = (result.sent, time.perf_counter())
+                    connection.sendto(self.get_packet(result.sent), (self.target, 0))
+                    result.sent += 1
+                if not outstanding:
+                    break
+                oldest = min(sent for (sequence, sent) in outstanding.values())
+                (readable, _, _) = select.select([connection], [], [], max(0, oldest + self.timeout - time.perf_counter()))
+                now = time.perf_counter()
+                if readable:
+                    (data, address) = connection.recvfrom(65536)
+                    short_sequence = self.parse_reply(data)
+                    if short_sequence is not None and address[0] == self.target:
+                        if short_sequence in outstanding:
+                            (sequence, sent) = outstanding.pop(short_sequence)
+                            result.rtts.append((now - sent) * 1e6)
+                            result.received += 1
+                            answered.add(short_sequence)
+                            if sequence < highest:
+                                result.reordered += 1
+                            highest = max(highest, sequence)
+                        elif short_sequence in answered:
+                            result.duplicates += 1
+                for (short_sequence, (sequence, sent)) in list(outstanding.items()):
+                    if now - sent >= self.timeout:
+                        del outstanding[short_sequence]
+                        result.lost.append(sequence)
+                done = result.sent - len(outstanding)
+                if done // self.check_every != last_checked and not result.stopped_early and result.sent < self.count:
+                    last_checked = done // self.check_every
+                    result.stopped_early = self.is_decided(result, done)
+        finally:
+            connection.close()
+        return result
@@ -0,0 +1,173 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Kernel log (/dev/kmsg) reading and live watching during tests
+#
+
+import errno, os, re, select, sys, threading
+
+# category: (action, pattern) - action "fail" fails the running sub-test,
+# "review" marks it for review
+KERNEL_LOG_PATTERNS = {
+    "mce": ("fail", r"mce: \[Hardware Error\]|Machine check events logged"),
+    "io_error": ("fail", r"I/O error|critical medium error|blk_update_request: .*error"),
+    "link_down": ("review", r"NIC Link is Down|Link is Down|carrier lost"),
+    "thermal": ("review", r"temperature above threshold|clock throttled|critical temperature"),
+    "gpu_hang": ("fail", r"GPU HANG|gpu hang|\*ERROR\* .*(hang|timed out)|ring \S+ timeout"),
+    "usb_reset": ("review", r"usb \S+: reset .*USB device"),
+}
+
+
+def parse_kernel_log_record(record):
+    """ parse one /dev/kmsg record "prio,seq,usec,flags;message"
+    returns (seq, usec, message) or None """
+    try:
+        header, message = record.split(";", 1)
+        fields = header.split(",")
+        # continuation lines (" KEY=value") follow the message
+        return (int(fields[1]), int(fields[2]), message.split("\n")[0])
+    except (ValueError, IndexError):
+        return None
+
+
+def read_kernel_log(since=-1, path="/dev/kmsg"):
+    """ returns the (seq, usec, message) records currently in the kernel log
+    buffer with a sequence number greater than since, or None if the kernel
+    log can not be read """
+    try:
+        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return None
+    records = list()
+    try:
+        while True:
+            try:
+                record = os.read(fd, 8192)
+            except OSError as e:
+                if e.errno == errno.EPIPE:
+                    # messages were overwritten before we read them
+                    continue
+                break
+            if not record:
+                break
+            parsed = parse_kernel_log_record(record.decode("utf-8", "replace"))
+            if parsed and parsed[0] > since:
+                records.append(parsed)
+    finally:
+        os.close(fd)
+    return records
+
+
+def get_kernel_log_sequence(path="/dev/kmsg"):
+    """ returns the sequence number of the newest kernel log record,
+    to be used with read_kernel_log(since=...) later """
+    records = read_kernel_log(path=path)
+    if records is None:
+        return None
+    if not records:
+        return -1
+    return records[-1][0]
+
+
+class KernelLogWatcher:
+    """ tails /dev/kmsg in a background thread and matches every new kernel
+    message against a set of patterns, tagging hits with the current context
+    (the running sub-test) """
+
+    def __init__(self, patterns=None, path="/dev/kmsg"):
+        if patterns is None:
+            patterns = KERNEL_LOG_PATTERNS
+        self.patterns = dict()
+        for (category, (action, pattern)) in patterns.items():
+            self.patterns[category] = (action, re.compile(pattern))
+        self.path = path
+        self.context = None
+        self.hits = list()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        self.fd = None
+
+    def start(self):
+        try:
+            self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+            # only new messages are interesting
+            os.lseek(self.fd, 0, os.SEEK_END)
+        except OSError as e:
+            print("Warning: could not watch kernel log %s" % self.path)
+            print(e)
+            self.fd = None
+            return False
+        self.running = True
+        self.thread = threading.Thread(target=self.__watch)
+        self.thread.daemon = True
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def set_context(self, context):
+        self.context = context
+
+    def get_mark(self):
+        """ returns a mark that get_result() can use to look at later hits only """
+        with self.lock:
+            return len(self.hits)
+
+    def get_hits(self, mark=0):
+        with self.lock:
+            return list(self.hits[mark:])
+
+    def get_result(self, mark=0, expected=()):
+        """ returns "FAIL", "REVIEW" or None for the hits since mark,
+        hits of the expected categories (e.g. "link_down" while bouncing a link) are ignored """
+        result = None
+        for hit in self.get_hits(mark):
+            if hit["category"] in expected:
+                continue
+            if hit["action"] == "fail":
+                return "FAIL"
+            result = "REVIEW"
+        return result
+
+    def __watch(self):
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        while self.running:
+            if not poller.poll(500):
+                continue
+            while True:
+                try:
+                    record = os.read(self.fd, 8192)
+                except OSError as e:
+                    if e.errno == errno.EPIPE:
+                        # messages were overwritten before we read them
+                        continue
+                    break
+                if not record:
+                    break
+                parsed = parse_kernel_log_record(record.decode("utf-8", "replace"))
+                if parsed:
+                    self.__match(parsed)
+
+    def __match(self, parsed):
+        (seq, usec, message) = parsed
+        for (category, (action, pattern)) in self.patterns.items():
+            if pattern.search(message):
+                hit = {"category": category, "action": action, "context": self.context,
+                       "usec": usec, "message": message}
+                with self.lock:
+                    self.hits.append(hit)
+                if action == "fail":
+                    prefix = "Error"
+                else:
+                    prefix = "Warning"
+                print("%s: kernel log (%s) during %s: %s" % (prefix, category, self.context, message))
+                sys.stdout.flush()
+                break
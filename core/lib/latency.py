@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Request/response (TCP_RR, UDP_RR) latency against the echo endpoint of the lab test server
+#
+
+import math, socket, struct, time
+
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL", 46)
+
+
+class LatencyResult:
+    """ round trip times of one run in microseconds """
+
+    def __init__(self, samples, lost=0):
+        self.samples = samples
+        self.lost = lost
+        self.sorted = sorted(samples)
+
+    def get_percentile(self, percent):
+        if not self.sorted:
+            return None
+        index = min(len(self.sorted) - 1, int(math.ceil(len(self.sorted) * percent / 100.0)) - 1)
+        return self.sorted[max(0, index)]
+
+    def get_mean(self):
+        if not self.samples:
+            return None
+        return sum(self.samples) / len(self.samples)
+
+    def get_jitter(self):
+        """ mean difference of consecutive round trips (RFC 3550 style) """
+        if len(self.samples) < 2:
+            return None
+        differences = [abs(self.samples[i] - self.samples[i - 1]) for i in range(1, len(self.samples))]
+        return sum(differences) / len(differences)
+
+    def get_histogram(self):
+        """ returns [(bucket low, bucket high, count)] of power of two buckets in microseconds """
+        buckets = dict()
+        for sample in self.samples:
+            bucket = int(math.floor(math.log(max(sample, 1.0), 2)))
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        return [(2 ** bucket, 2 ** (bucket + 1), buckets[bucket]) for bucket in sorted(buckets)]
+
+    def print_report(self, title):
+        print("%s: %u round trips, %u lost" % (title, len(self.samples), self.lost))
+        if not self.samples:
+            return
+        print("    min %.1f us, p50 %.1f us, p99 %.1f us, p99.9 %.1f us, max %.1f us" % (
+            self.sorted[0], self.get_percentile(50), self.get_percentile(99), self.get_percentile(99.9),
+            self.sorted[-1]))
+        print("    mean %.1f us, jitter %.1f us" % (self.get_mean(), self.get_jitter() or 0))
+        width = 50
+        highest = max(count for (low, high, count) in self.get_histogram())
+        for (low, high, count) in self.get_histogram():
+            print("    %7u - %7u us |%-*s %u" % (low, high, width, "#" * max(1, int(count * width / highest)), count))
+
+
+class LatencyProbe:
+    """ sends messages of size bytes to an echo server one at a time and
+    measures the time until each comes back (netperf TCP_RR/UDP_RR style) """
+
+    def __init__(self, server, port, protocol="tcp", size=64, count=10000, warmup=100,
+                 busy_poll=0, timeout=1.0, source=None, max_lost=10):
+        self.server = server
+        self.port = port
+        self.protocol = protocol
+        self.size = max(8, size)
+        self.count = count
+        self.warmup = warmup
+        self.busy_poll = busy_poll # microseconds of busy polling (SO_BUSY_POLL), 0 is off
+        self.timeout = timeout
+        self.source = source # source address, selects the NIC when several reach the server
+        self.max_lost = max_lost # consecutive lost UDP responses before giving up
+
+    def connect(self):
+        if self.protocol == "tcp":
+            connection = socket.create_connection((self.server, self.port), timeout=self.timeout,
+                                                  source_address=(self.source, 0) if self.source else None)
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        else:
+            address = socket.getaddrinfo(self.server, self.port, 0, socket.SOCK_DGRAM)[0]
+            connection = socket.socket(address[0], socket.SOCK_DGRAM)
+            connection.settimeout(self.timeout)
+            if self.source:
+                connection.bind((self.source, 0))
+            connection.connect(address[4])
+        if self.busy_poll:
+            try:
+                connection.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, self.busy_poll)
+            except OSError as e:
+                print("Warning: could not enable busy polling: %s" % e)
+        return connection
+
+    def transact(self, connection, sequence):
+        """ one request/response, returns the round trip in microseconds or None if lost.
+        UDP requests carry a sequence number so a late response is not taken for the next one """
+        message = struct.pack("!Q", sequence) + b"e" * (self.size - 8)
+        started = time.perf_counter()
+        try:
+            if self.protocol == "tcp":
+                connection.sendall(message)
+                received = 0
+                while received < self.size:
+                    data = connection.recv(self.size - received)
+                    if not data:
+                        raise OSError("connection closed by the echo server")
+                    received += len(data)
+            else:
+                connection.send(message)
+                while connection.recv(65536)[:8] != message[:8]:
+                    pass
+        except socket.timeout:
+            if self.protocol == "tcp":
+                # a stream can not lose a response, the connection is stuck
+                raise OSError("no response within %s seconds" % self.timeout)
+            return None
+        return (time.perf_counter() - started) * 1e6
+
+    def run(self):
+        """ returns LatencyResult, raises OSError if the echo server can not be reached
+        or max_lost responses in a row are lost (e.g. a firewall drops UDP) """
+        connection = self.connect()
+        samples = list()
+        lost = 0
+        lost_in_row = 0
+        try:
+            for index in range(self.warmup + self.count):
+                rtt = self.transact(connection, index)
+                if rtt is None:
+                    lost_in_row += 1
+                    if lost_in_row >= self.max_lost:
+                        raise OSError("no response to %u requests in a row from %s port %s"
+                                      % (lost_in_row, self.server, self.port))
+                else:
+                    lost_in_row = 0
+                if index < self.warmup:
+                    continue
+                if rtt is None:
+                    lost += 1
+                else:
+                    samples.append(rtt)
+        finally:
+            connection.close()
+        return LatencyResult(samples, lost)
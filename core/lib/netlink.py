@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Interface state - IPv4 address (SIOCGIFADDR), carrier, and waiting for their
+# changes on rtnetlink link/address events instead of sleeping
+#
+
+import fcntl, select, socket, struct, time
+
+SIOCGIFADDR = 0x8915
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+
+
+def get_ipv4_address(interface):
+    """ returns the IPv4 address of interface or None """
+    connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        request = struct.pack("256s", interface[:15].encode("utf-8"))
+        return socket.inet_ntoa(fcntl.ioctl(connection.fileno(), SIOCGIFADDR, request)[20:24])
+    except OSError:
+        return None
+    finally:
+        connection.close()
+
+
+def has_carrier(interface):
+    try:
+        with open("/sys/class/net/%s/carrier" % interface) as carrier_file:
+            return carrier_file.read().strip() == "1"
+    except (IOError, OSError):
+        # reading carrier of a down interface fails
+        return False
+
+
+class InterfaceEvents:
+    """ rtnetlink socket subscribed to link and IPv4 address changes.
+    wait() checks its condition again on every event, and at least every
+    poll seconds in case events were dropped or netlink is not available """
+
+    def __init__(self, poll=1.0):
+        self.poll = poll
+        try:
+            self.connection = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            self.connection.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+        except (OSError, AttributeError) as e:
+            print("Warning: no rtnetlink events (%s), polling interface state" % e)
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def wait(self, condition, timeout):
+        """ returns True as soon as condition() is true, False after timeout seconds """
+        deadline = time.time() + timeout
+        while True:
+            # subscribed before the check, so a change right after it is not missed
+            if condition():
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            if not self.connection:
+                time.sleep(min(self.poll, remaining))
+                continue
+            (readable, _, _) = select.select([self.connection], [], [], min(self.poll, remaining))
+            if readable:
+                try:
+                    # the content does not matter, every event triggers a new check
+                    self.connection.recv(65536)
+                except OSError:
+                    # ENOBUFS - events were dropped, the check covers them
+                    pass
+
+
+def wait_for_address(interface, timeout):
+    """ wait until interface has an IPv4 address, returns it or None """
+    with InterfaceEvents() as events:
+        if events.wait(lambda: get_ipv4_address(interface) is not None, timeout):
+            return get_ipv4_address(interface)
+    return None
+
+
+def wait_for_no_address(interface, timeout):
+    with InterfaceEvents() as events:
+        return events.wait(lambda: get_ipv4_address(interface) is None, timeout)
+
+
+def wait_for_carrier(interface, timeout):
+    with InterfaceEvents() as events:
+        return events.wait(lambda: has_carrier(interface), timeout)
@@ -3,15 +3,23 @@
 # Network library is used by wlan test
 #
 
-import os, signal, sys, re, time, subprocess
+import os, signal, socket, sys, re, time, subprocess, threading
 import math
 
 directory = os.path.abspath('../..')
 sys.path.append(directory)
 
-from core.release import EuroLinuxRelease
 from core.test import Test
 from core.lib.devices import get_devices
+from core.lib.test_server import ECHO_PORT, TestServerClient
+from core.lib.latency import LatencyProbe
+from core.lib.icmp import IcmpProber, get_loss_interval
+from core.lib.nic import NicInfo
+from core.lib.routing import SourceRoutes
+from core.lib.wlan import get_interface_phy, get_phy_list, get_wireless_capabilities
+from core.lib.payload import PayloadGenerator
+from core.lib.netlink import get_ipv4_address, wait_for_address, wait_for_carrier, wait_for_no_address
+from core.lib.throughput import ThroughputEngine, ThroughputResult, get_interface_numa_node
 
 
 class Wireless:
@@ -92,48 +100,42 @@ class Wireless:
                 self.parameters[interface][pair[0].strip()] = pair[1].strip()
 
     def get_type(self, logical_name=None):
-        phy_list = self.get_phy_list()
-        for phy in phy_list:
-            if phy != self.get_phy(logical_name):
-                continue
-            try:
-                all_the_info = subprocess.getoutput("iw %s info" % phy).split("\n")
-            except Exception as e:
-                continue
-            vht_capabilities = [x for x in all_the_info if 'VHT Capabilities' in x]
-            short_GI80 = [x for x in all_the_info if 'short GI (80 MHz)' in x]
-            ht20_ht40 = [x for x in all_the_info if 'HT20/HT40' in x]
-            fifty_four_Mbps = [x for x in all_the_info if '54.0 Mbps' in x]
-
-            if self.is_ax_device(logical_name) and self.test_interface_speed(logical_name, 1200):
-                print("Wireless AX")
-                return "ax"
-            elif vht_capabilities and short_GI80 and self.test_interface_speed(logical_name, 1200):
-                print("Wireless AX")
-                return "ax"
-            elif vht_capabilities and short_GI80:
-                print("Wireless AC")
-                return "ac"
-            elif ht20_ht40 and not vht_capabilities:
-                print("Wireless N")
-                return "n"
-            elif fifty_four_Mbps and not ht20_ht40 and not vht_capabilities:
-                print("Wireless G")
-                return "g"
-            else:
-                print("Wireless B")
-                return "b"
-        return None
+        phy = self.get_phy(logical_name)
+        if not phy:
+            return None
+        capabilities = get_wireless_capabilities(phy)
+        vht_capabilities = capabilities.supports("vht")
+        short_GI80 = capabilities.supports("short_gi_80")
+        ht20_ht40 = capabilities.supports("ht")
+        fifty_four_Mbps = capabilities.supports("54mbps")
+
+        if capabilities.supports("he") or capabilities.supports("eht"):
+            print("Wireless AX")
+            return "ax"
+        elif self.is_ax_device(logical_name) and self.test_interface_speed(logical_name, 1200):
+            print("Wireless AX")
+            return "ax"
+        elif vht_capabilities and short_GI80 and self.test_interface_speed(logical_name, 1200):
+            print("Wireless AX")
+            return "ax"
+        elif vht_capabilities and short_GI80:
+            print("Wireless AC")
+            return "ac"
+        elif ht20_ht40 and not vht_capabilities:
+            print("Wireless N")
+            return "n"
+        elif fifty_four_Mbps and not ht20_ht40 and not vht_capabilities:
+            print("Wireless G")
+            return "g"
+        else:
+            print("Wireless B")
+            return "b"
 
     def get_phy_list(self):
-        rfkill_command = "rfkill list all"
-        try:
-            pattern = re.compile("\d: (?P<wifi>.*):.*Wireless LAN")
-            rfkill = subprocess.getoutput(rfkill_command)
-            return pattern.findall(rfkill)
-        except:
+        phy_list = get_phy_list()
+        if not phy_list:
             print("Warning: no wifi device found")
-            return []
+        return phy_list
 
     def get_phy(self, logical_name):
         """
@@ -143,25 +145,9 @@ class Wireless:
         logical_name (str):  Logical Name of Device
 
         Returns:
-        char: 'phy' of Device
+        str: 'phy' of Device or None
         """
-        try:
-            dev_cmd_info = subprocess.getoutput("iw dev").split("\n")
-        except Exception as e:
-            return None
-
-        phy = str()
-        for attr in dev_cmd_info:
-            try:
-                if attr.startswith("phy"):
-                    phy = attr.replace('#','')
-                elif 'Interface' in attr:
-                    interface_name = attr.strip().split(' ')[1]
-                    if interface_name == logical_name:
-                        return phy
-            except KeyError as e:
-                continue
-        return None
+        return get_interface_phy(logical_name)
 
     def is_ax_device(self, logical_name):
         """
@@ -183,16 +169,11 @@ class Wireless:
         return False
 
     def get_product_name(self, logical_name):
-        lshw_command = "lshw -c network | grep -B5 'logical name: {}'".format(logical_name)
-        try:
-            lshw_command_string_list = subprocess.getoutput(lshw_command).strip("\n")
-            products = [x.strip().replace('product: ','') for x in lshw_command_string_list if 'product' in x]
-            if products:
-                return products[0]
-        except Exception as e:
+        phy = self.get_phy(logical_name)
+        if not phy:
             print("Error: Could not identify product name from logical device name.")
-            print(e)
-        return str()
+            return str()
+        return get_wireless_capabilities(phy).product
 
     def test_interface_speed(self, logical_name, test_speed=0):
         """
@@ -235,11 +216,26 @@ class NetworkTest(Test):
 
     iperf_port = 5201
     ipref_total_ports = 2
+    # used when no lab test server is set - measures the internet link, not the NIC
+    public_test_server = "lon.speedtest.clouvider.net"
+    # one instance is planned per interface - the first one tests all of them at once and
+    # the others report the result of their interface from it
+    all_interfaces_tested = False
+    shared_results = dict() # interface: ThroughputResult of testing all interfaces at once
 
     def __init__(self, path):
-        self.release = EuroLinuxRelease()
         self.user = None
-        self.test_server = "lon.speedtest.clouvider.net"
+        # address of the EOHC lab test server (start_test_server.py) on the bench
+        self.test_server = os.environ.get("EOHC_TEST_SERVER") or NetworkTest.public_test_server
+        self.test_server_client = None
+        self.iperf_ports = list()
+        self.nic_info = None
+        # test all interfaces at once over per-interface source routes instead of
+        # shutting the other interfaces down
+        self.test_all_interfaces = False
+        self.source_routes = None
+        self.test_interfaces = list() # [(interface, address)] tested at once
+        self.planned_interfaces = list() # interfaces of all instances planned with this one
         path = "network/" + path
         Test.__init__(self, path)
         self.no_proc = 2
@@ -253,11 +249,22 @@ class NetworkTest(Test):
         self.ignore_interfaces = re.compile("lo$|peth\d+|virbr\d+|vif\d+.\d+|xenbr\d+|wmaster\d+|sit\d+")
         self.enforce_speed = False
         self.bandwidth_target = 0.6 # 60%
+        self.bandwidth_duration = 10 # seconds of one measurement
+        self.bandwidth_streams = 1 # parallel streams of each iperf3 client
+        self.latency_sizes = [64, 1024] # request/response message sizes in bytes
+        self.latency_count = 10000 # round trips of each message size
+        self.latency_busy_poll = 0 # microseconds of SO_BUSY_POLL, 0 is off
+        # link speed in Mb/s: (p99, p99.9) round trip limits in microseconds - not checked
+        # on real hardware yet and measured through python on both ends, so only warnings
+        self.latency_thresholds = {100: (1000, 3000), 1000: (250, 1000), 10000: (100, 400),
+                                   25000: (80, 300), 100000: (60, 200)}
         self.interface_connect = "nmcli conn up"
         self.interface_disconnect = "nmcli conn down"
         self.alt_interface_connect = "nmcli dev connect"
         self.alt_interface_disconnect = "nmcli dev disconnect"
         self.opened_ports = list()
+        # firewall ports of the iperf3 servers, [start, end)
+        self.iperf_port_range = (NetworkTest.iperf_port, NetworkTest.iperf_port + NetworkTest.ipref_total_ports)
         if self.release.get_version() == 7:
             self.interface_connect = "ifup"
             self.interface_disconnect = "ifdown"
@@ -279,15 +286,32 @@ class NetworkTest(Test):
                 interface_devices[logical_device] = device
         return interface_devices
 
+    def set_planned_interfaces(self, tests):
+        """ tell planned instances about each other, so testing all interfaces at once
+        covers just their interfaces and runs once """
+        interfaces = [test.logical_device_name for test in tests]
+        for test in tests:
+            test.planned_interfaces = interfaces
+        NetworkTest.all_interfaces_tested = False
+        NetworkTest.shared_results = dict()
+
     def run(self):
         self.user = "root"
+        if self.test_all_interfaces:
+            if NetworkTest.all_interfaces_tested:
+                # measured by the first instance together with the others
+                return self.run_sub_test(self.report_shared_bandwidth, "Network throughput TCP",
+                                         "result of the interface from testing all interfaces at once")
+            NetworkTest.all_interfaces_tested = True
         try:
             # start preparing systems
             if not self.run_sub_test(self.prepare_for_run, "Network setup", "prepare for network testing"):
                 return False
             if not self.run_sub_test(self.start_iperf_services_on_lts, "Network iperf3", "start iperf3 service on test server"):
                 return False
-            if not self.run_sub_test(self.configure_interfaces, "Network interfaces", "configuration of the interfaces"):
+            # bouncing the interface and shutting the others down takes links down on purpose
+            if not self.run_sub_test(self.configure_interfaces, "Network interfaces", "configuration of the interfaces",
+                                     expected_kernel_log=("link_down",)):
                 return False
             if not self.run_sub_test(self.print_info, "Network info", "showing NIC informations"):
                 return False
@@ -296,19 +320,24 @@ class NetworkTest(Test):
 
             # start testing
             success = True
-            if not self.run_sub_test(self.tcp_test_latency, "Network latency TCP", "checking TCP latency via iperf3"):
+            if not self.run_sub_test(self.tcp_test_latency, "Network latency TCP", "checking TCP request/response latency"):
                 success = False
             if not self.run_sub_test(self.tcp_test_bandwidth, "Network throughput TCP", "checking TCP throughput via iperf3"):
                 success = False
-            if not self.run_sub_test(self.udp_test, "Network latency UDP", "checking UDP latency via iperf3"):
+            if not self.run_sub_test(self.udp_test, "Network latency UDP", "checking UDP request/response latency"):
                 success = False
             if not self.run_sub_test(self.icmp_test, "Network ICMP test", "checking number of loss packets"):
                 success = False
+            for (sub_test, name, description, expected_kernel_log) in self.get_extra_sub_tests():
+                if not self.run_sub_test(sub_test, name, description, expected_kernel_log=expected_kernel_log):
+                    success = False
             if not self.run_sub_test(self.stop_iperf_services_on_lts, "Network iperf3 stop", "stops iperf3 service on test server"):
                 success = False
 
             self.set_signal_handler(None)
-            if self.is_nfs_root_system:
+            if self.source_routes:
+                self.source_routes.remove()
+            elif self.is_nfs_root_system:
                 self.remove_route()
             else:
                 self.restore_all_other_interfaces()
@@ -318,8 +347,17 @@ class NetworkTest(Test):
         except Exception as e:
             print(e)
         finally:
-            self.close_ports(NetworkTest.iperf_port, NetworkTest.iperf_port + NetworkTest.ipref_total_ports)
+            if self.source_routes and self.source_routes.interfaces:
+                self.source_routes.remove()
+            if self.iperf_ports:
+                self.stop_iperf_services_on_lts()
+            self.close_ports(*self.iperf_port_range)
     
+    def get_extra_sub_tests(self):
+        """ subclasses return [(function, name, description, expected kernel log categories)]
+        of sub-tests to run after the common ones, while the test server ports are still running """
+        return list()
+
     # 1
     def prepare_for_run(self):
         print("\nStarting network test verification...")
@@ -334,10 +372,12 @@ class NetworkTest(Test):
 
         if self.test_server is None or self.test_server == "unknown":
             errors.append("No test server was set.")
+        elif self.test_server == NetworkTest.public_test_server:
+            print("Warning: no lab test server set (EOHC_TEST_SERVER), using the public server %s" % self.test_server)
+            print("Warning: results measure the internet connection, not the NIC")
 
         self.get_all_other_interfaces()
         self.check_nfs_root_file_system()
-        self.open_ports(NetworkTest.iperf_port, NetworkTest.iperf_port + NetworkTest.ipref_total_ports)
 
         if errors:
             print("\nNetwork test for %s failed verification:" % self.interface)
@@ -349,19 +389,7 @@ class NetworkTest(Test):
             print("Error: %s" % error)
 
     def get_ip_address(self, interface):
-        pipe = os.popen("ip -4 addr show %s" % (interface))
-        pattern = re.compile("\d+\.\d+\.\d+\.\d+")
-        while 1:
-            line = pipe.readline()
-            match = pattern.search(line)
-            if match or not line:
-                break
-        pipe.close()
-        if match:
-            ip_address = match.group()
-            return ip_address
-        else:
-            return None
+        return get_ipv4_address(interface)
 
     def get_all_other_interfaces(self):
         self.all_other_interfaces = list()
@@ -372,7 +400,12 @@ class NetworkTest(Test):
             if line:
                 interface = line.strip()
                 if not self.ignore_interfaces.search(interface):
-                    if interface != self.interface:
+                    if interface == self.interface:
+                        pass
+                    elif self.test_all_interfaces and interface not in self.planned_interfaces:
+                        # other kinds of interfaces stay up, but are not measured with ours
+                        print("not testing interface %s at once with %s" % (interface, self.interface))
+                    else:
                         self.all_other_interfaces.append(interface)
                 print("ignoring interface %s" % interface)
             else:
@@ -414,19 +447,24 @@ class NetworkTest(Test):
         req_thread = math.ceil(req_thread)
         self.no_proc = min(req_thread, no_proc)
         print("No. of parallel iperf thread required: %s" % self.no_proc)
+        interfaces = 1
+        if self.test_all_interfaces:
+            # every interface gets ports of its own
+            interfaces = 1 + len(self.all_other_interfaces)
+        self.iperf_port_range = (NetworkTest.iperf_port, NetworkTest.iperf_port + int(self.no_proc) * interfaces)
+        self.open_ports(*self.iperf_port_range)
         check_firewall = True
         check_firewall = self.__check_firewall_ports()
-        result = self.__do_iperf_action('start', no_proc=self.no_proc)
+        result = self.__do_iperf_action('start', no_proc=self.no_proc * interfaces)
         if not check_firewall:
             return "WARN"
         return result
 
     def __check_firewall_ports(self):
         result = True
-        start_iperf_port = NetworkTest.iperf_port
-        total_iperf_ports = NetworkTest.ipref_total_ports
+        (start_iperf_port, end_iperf_port) = self.iperf_port_range
         req_ports = []
-        for port in range(start_iperf_port, start_iperf_port + total_iperf_ports):
+        for port in range(start_iperf_port, end_iperf_port):
             req_ports.append(port)
         ports_to_open = self.__get_firewall_ports(req_ports)
         if ports_to_open:
@@ -457,24 +495,29 @@ class NetworkTest(Test):
     def __do_iperf_action(self, verb, no_proc=2):
         if verb not in ['start', 'stop']:
             return False
-        result = True
         start_port = NetworkTest.iperf_port
         if verb == 'start':
+            self.test_server_client = TestServerClient(self.test_server)
+            if not self.test_server_client.is_available():
+                # public iperf3 servers keep their ports running
+                print("Warning: no EOHC lab test server on %s, assuming iperf3 runs on ports %s-%s"
+                      % (self.test_server, start_port, start_port + int(no_proc) - 1))
+                self.test_server_client = None
+                return True
             print("Starting iperf3 server on Test Server")
-            try:
-                cmd_wt_port = "for port in `seq %s %s`; do iperf3 -s -D -p $port; done"\
-                              % (start_port, (start_port + int(no_proc) - 1))
-                print("Using the command: %s" % cmd_wt_port)
-                print(subprocess.getoutput(cmd_wt_port))
-            except Exception as e:
-                print("Error: Failed to start the iperf3 server on Test Server")
-                print(e)
-                result = False
-        else:          
+            ports = list(range(start_port, start_port + int(no_proc)))
+            self.iperf_ports = self.test_server_client.start_iperf(ports)
+            if self.iperf_ports != ports:
+                print("Error: Failed to start the iperf3 server on Test Server ports %s"
+                      % sorted(set(ports) - set(self.iperf_ports)))
+                return False
+            print("iperf3 runs on Test Server ports %s" % self.iperf_ports)
+        elif self.test_server_client and self.iperf_ports:
             print("Stopping iperf3 server on Test Server")
-            subprocess.getoutput("pkill -f -15 iperf3")
-
-        return result
+            if not self.test_server_client.stop_iperf(self.iperf_ports):
+                print("Warning: could not stop iperf3 on Test Server ports %s, their lease will expire" % self.iperf_ports)
+            self.iperf_ports = list()
+        return True
 
     # 3
     def configure_interfaces(self):
@@ -482,7 +525,12 @@ class NetworkTest(Test):
         if not self.bounce_interface():
             print("Error: could not bounce interface %s" % self.interface)
             return False
-        if self.is_nfs_root_system:
+        if self.test_all_interfaces:
+            if not self.add_source_routes():
+                print("Error: could not add source routes for testing")
+                return False
+            self.set_signal_handler(self.source_routes.remove)
+        elif self.is_nfs_root_system:
             if not self.add_route():
                 print("Error: could not add route for testing")
                 return False
@@ -506,8 +554,6 @@ class NetworkTest(Test):
         if not self.shutdown_interface(self.interface):
             print("Error: could not shut down interface %s" % self.interface)
             success = False
-        # Waiting for 2 sec, before we start the interface again
-        time.sleep(2)
         if not self.start_interface(self.interface):
             print("Error: could not restart interface %s" % self.interface)
             success = False
@@ -528,18 +574,11 @@ class NetworkTest(Test):
                 print("Warning: could not shut down interface %s" % interface)
 
         # confirm that it really went down (or is all ready down)
-        slept=0
-        delay=15
-        down = False
-        while not down and slept < delay:
-            if subprocess.getstatusoutput("ip -f inet addr show %s | grep inet" % interface)[0] == 0:
-                print("Interface %s is up" % interface)
-                time.sleep(1)
-                slept = slept + 1
-            else:
-                print("interface %s is down" % interface)
-                down = True
-        if not down:
+        delay = 15
+        down = wait_for_no_address(interface, delay)
+        if down:
+            print("interface %s is down" % interface)
+        else:
             print("Error: Unable to shut down interface %s" % interface)
         return down
 
@@ -555,54 +594,58 @@ class NetworkTest(Test):
             else:
                 if subprocess.getstatusoutput("%s %s" % (self.alt_interface_connect, interface))[0] == 0:
                     interface_up = True
-                time.sleep(2)
+                else:
+                    # give the device a moment before trying again - a fixed pause, the
+                    # carrier may already be up when connecting fails
+                    time.sleep(2)
                 count += 1
         if not interface_up:
             print("Error: Failed to bring up the device %s" % interface)
             return False
         sys.stdout.flush()
 
-        # Since there can be a delay between ifup and linkup we need to
-        # wait to see the interface running.
-        slept=0
-        wait = 3
-        delay=30
-        print(subprocess.getoutput("ip -f inet addr show %s | grep inet" % interface))
-        while slept < delay:
-            try:
-                print("Interface %s is UP" % interface)
-                return True
-            except Exception:
-                time.sleep(wait)
-                slept = slept + wait
-                sys.stdout.flush()
-        return False
+        # Since there can be a delay between ifup and linkup (and DHCP) we need
+        # to wait to see the interface running.
+        delay = 30
+        started = time.time()
+        if not wait_for_carrier(interface, delay):
+            print("Error: interface %s has no carrier" % interface)
+            return False
+        address = wait_for_address(interface, max(0, delay - (time.time() - started)))
+        if not address:
+            print("Error: interface %s got no IPv4 address" % interface)
+            return False
+        print("Interface %s is UP at %s after %.1f s" % (interface, address, time.time() - started))
+        return True
 
     def get_interface_ip(self, interface):
-        try:
-            ip_addr_command = subprocess.getoutput("ip addr show %s | grep inet" % interface)
-            match = re.search('.*inet (?P<ip_address>.+)\/.*', ip_addr_command)
-            return match.group('ip_address')
-        except Exception:
-            print("Error: ip addr show %s has no inet configured" % interface)
-            return None
+        address = get_ipv4_address(interface)
+        if not address:
+            print("Error: interface %s has no inet configured" % interface)
+        return address
 
     def ping_test_server(self, interface):
         interface_ip = self.get_interface_ip(interface)
         if not interface_ip:
             return False
-        wait = 3 # sec
-        slept=0
-        delay=30 # sec
-        sys.stdout.write("Checking via ping to %s... " % self.test_server)
-        print("ping -I %s -Ac1 %s > /dev/null" % (interface_ip, self.test_server))
-        while slept < delay:
-            if os.system("ping -I %s -Ac1 %s > /dev/null" % (interface_ip, self.test_server)):
-                time.sleep(wait)
-                slept = slept + wait
-            else:
+        delay = 30 # sec
+        sys.stdout.write("Checking via ping to %s from %s... " % (self.test_server, interface_ip))
+        sys.stdout.flush()
+        deadline = time.time() + delay
+        error = None
+        while time.time() < deadline:
+            try:
+                # one echo request, waiting up to a second for the reply
+                result = IcmpProber(self.test_server, count=1, window=1, timeout=1.0, source=interface_ip).run()
+            except OSError as e:
+                # e.g. network unreachable while routes are being set up
+                error = e
+                time.sleep(1)
+                continue
+            if result.received:
                 print("done")
                 return True
+        print("no reply%s" % (" (%s)" % error if error else ""))
         return False
 
     def get_interface_speed(self, interface):
@@ -645,6 +688,34 @@ class NetworkTest(Test):
         else:
             return True
 
+    def add_source_routes(self):
+        """ route traffic to the test server from the address of every UP interface over that interface """
+        try:
+            destination = socket.gethostbyname(self.test_server)
+        except OSError as e:
+            print("Error: could not resolve %s: %s" % (self.test_server, e))
+            return False
+        self.source_routes = SourceRoutes(destination)
+        self.test_interfaces = list()
+        for interface in [self.interface] + self.all_other_interfaces:
+            address = self.get_ip_address(interface)
+            if not address:
+                print("Warning: interface %s has no IPv4 address, not tested" % interface)
+                continue
+            if not self.source_routes.add(interface, address):
+                self.source_routes.remove()
+                return False
+            self.test_interfaces.append((interface, address))
+        print("Testing interfaces %s at once" % ", ".join(interface for (interface, address) in self.test_interfaces))
+        return True
+
+    def get_source_address(self):
+        """ address to bind to when other interfaces stay up, None otherwise """
+        for (interface, address) in self.test_interfaces:
+            if interface == self.interface:
+                return address
+        return None
+
     def down_all_other_interfaces(self):
         if not self.all_other_interfaces:
             return True
@@ -653,28 +724,17 @@ class NetworkTest(Test):
             print(interface)
             if not self.shutdown_interface(interface):
                 return False
-        wait = 10 # sec
-        sys.stdout.write("waiting %d sec..." % wait)
-        sys.stdout.flush()
-        time.sleep(wait)
-        print("done")
         return True
 
     def regenerate_test_file(self, file=None):
         if not file:
             file = self.test_file
+        # use interface_speed/8 blocks of 128 KB, creating a file that takes very roughly 10 sec to transfer
+        size = int(float(self.interface_speed) / 8) * 128 * 1024
         try:
-            os.remove(file)
-        except OSError:
-            pass
-        # use interface_speed/8, creating a file that takes very roughly 10 sec to transfer
-        count = self.interface_speed/8
-        blocksize = 128 # KB
-        try:
-            subprocess.getoutput("dd if=/dev/urandom of=%s bs=%uk count=%u" % (file, blocksize, count))
-        except Exception:
-            # dd shows output on stderr, ignore this
-            pass
+            PayloadGenerator().write_file(file, size)
+        except (IOError, OSError) as e:
+            print("Warning: could not create %s: %s" % (file, e))
         return True
 
     # 4
@@ -684,7 +744,7 @@ class NetworkTest(Test):
         try:
             ethtool_cmd = "ethtool %s" % self.interface
             print(ethtool_cmd)
-            subprocess.getoutput(ethtool_cmd)
+            print(subprocess.getoutput(ethtool_cmd))
             print("")
             try:
                 ip_link_show = subprocess.getoutput("ip link show %s | grep link/ether" % self.interface)
@@ -697,10 +757,15 @@ class NetworkTest(Test):
             biosdevname_cmd = "biosdevname -d %s" % self.interface
             print("")
             print(biosdevname_cmd)
-            subprocess.getoutput(biosdevname_cmd)
+            print(subprocess.getoutput(biosdevname_cmd))
         except Exception as e:
             print("Warning: %s" % e)
 
+        print("")
+        self.nic_info = NicInfo(self.interface)
+        self.nic_info.print_report()
+        for warning in self.nic_info.get_warnings():
+            print("Warning: %s" % warning)
         return True
 
     # 5
@@ -775,112 +840,218 @@ class NetworkTest(Test):
 
     # 6
     def tcp_test_latency(self):
-        print("Testing TCP latency to %s..." % self.test_server)
+        return self.__test_latency("tcp")
+
+    def __get_latency_thresholds(self):
+        """ returns (p99, p99.9) limits in microseconds of the fastest link speed not above the interface speed """
+        speed = int(self.get_interface_speed(self.interface) or self.interface_speed)
+        limits = self.latency_thresholds[min(self.latency_thresholds)]
+        for link_speed in sorted(self.latency_thresholds):
+            if link_speed <= speed:
+                limits = self.latency_thresholds[link_speed]
+        return (speed, limits)
+
+    def __test_latency(self, protocol):
+        name = protocol.upper()
+        if not self.test_server_client:
+            print("Warning: %s latency needs the echo endpoint of an EOHC lab test server (EOHC_TEST_SERVER), not measured" % name)
+            return "WARN"
+        status = self.test_server_client.get_status() or dict()
+        port = status.get("echo", ECHO_PORT)
+        (speed, (p99_limit, p999_limit)) = self.__get_latency_thresholds()
+        print("Testing %s request/response latency to %s port %s..." % (name, self.test_server, port))
+        print("Limits for %s Mb/s: p99 %s us, p99.9 %s us" % (speed, p99_limit, p999_limit))
+        if self.latency_busy_poll:
+            print("Busy polling %s us" % self.latency_busy_poll)
         sys.stdout.flush()
-        try:
-            cmd_wo_port = "iperf3 -c %s -t 5" % self.test_server
-            for i in range(5):
-                result = subprocess.getstatusoutput(NetworkTest.add_iperf_port(cmd_wo_port))
-                if result[0] == 0:
-                    print(result[1])
-                    break
-                print(result)
-                time.sleep(5)
-        except Exception as e:
-            print("Error: TCP latency test failed")
-            print(e)
-            return False
-        return True
-
-    @staticmethod
-    def add_iperf_port(cmd):
-        if NetworkTest.iperf_port:
-            cmd = cmd + " -p %s" % NetworkTest.iperf_port
-        return cmd
+        success = True
+        for size in self.latency_sizes:
+            probe = LatencyProbe(self.test_server, port, protocol=protocol, size=size, count=self.latency_count,
+                                 busy_poll=self.latency_busy_poll, source=self.get_source_address())
+            try:
+                result = probe.run()
+            except OSError as e:
+                print("Error: %s latency test failed: %s" % (name, e))
+                return False
+            print("")
+            result.print_report("%s_RR %u bytes" % (name, size))
+            if not result.samples:
+                print("Error: no %s responses from %s" % (name, self.test_server))
+                return False
+            p99 = result.get_percentile(99)
+            p999 = result.get_percentile(99.9)
+            self.report_metric("%s p99 %uB" % (name, size), round(p99, 1), "us")
+            if p99 > p99_limit:
+                print("Warning: %s p99 latency of %.1f us is above %s us" % (name, p99, p99_limit))
+                success = "WARN"
+            elif p999 > p999_limit:
+                print("Warning: %s p99.9 latency of %.1f us is above %s us" % (name, p999, p999_limit))
+                success = "WARN"
+            sent = len(result.samples) + result.lost
+            if result.lost > sent / 100.0:
+                print("Warning: %u of %u %s requests lost" % (result.lost, sent, name))
+                success = "WARN"
+        return success
 
     # 7
     def tcp_test_bandwidth(self):
+        if self.test_interfaces:
+            return self.__test_all_interfaces_bandwidth()
         print("Testing TCP bandwidth to %s..." % self.test_server)
         cycles = 5
-        no_proc = self.no_proc
         start_port = NetworkTest.iperf_port
-        bw_tcp = "for port in `seq %s %s`; do iperf3 -c %s -p $port -f m -T $port & done | grep Mbits/sec" % (start_port, (start_port + int(no_proc) - 1), self.test_server)
+        engine = ThroughputEngine(self.test_server, range(start_port, start_port + int(self.no_proc)),
+                                  interface=self.interface, duration=self.bandwidth_duration,
+                                  streams=self.bandwidth_streams)
+        node = get_interface_numa_node(self.interface)
+        print("iperf3 clients pinned to CPUs %s (NUMA node %s of %s)" % (",".join(str(cpu) for cpu in engine.cpus),
+              "unknown" if node is None else node, self.interface))
         for p in range(cycles):
             print("\n\nAttempt No: %s" % (p + 1))
-            try:
-                while True:
-                    bw_output = subprocess.getstatusoutput(bw_tcp)
-                    if bw_output[0] == 0:
-                        bw_output = bw_output[1].split("\n")
-                        break
-                    time.sleep(1)
-            except Exception as e:
+            result = engine.run()
+            if result.errors:
                 print("Error: TCP bandwidth test failed")
-                print(e)
                 return False
-            speed = 0.0
-            for output in bw_output:
-                match = re.search(".*?(?P<speed>[\d\.]+)\s+Mbits/sec.*", output)
-                if match:
-                    sp = match.group("speed")
-                    print("Bandwidth Output: '%s'\n    Speed: %s Mb/sec" % (output.split(":")[1].strip(), sp))
-                    speed += float(sp)
-            print("\nTotal Bandwidth: %s Mb/sec" % speed)
-            if speed > self.interface_speed * self.bandwidth_target:
+            for (port, stream, bits) in result.streams:
+                print("Stream port %s socket %s: %.1f Mb/sec" % (port, stream, bits / 1e6))
+            for (queue, bits) in sorted(result.queues.items()):
+                print("Queue %s: %.1f Mb/sec" % (queue, bits / 1e6))
+            speed = result.total / 1e6
+            print("\nTotal Bandwidth: %.1f Mb/sec, %u retransmits" % (speed, result.retransmits))
+            if result.get_cpu_per_gbit() is not None:
+                print("CPU utilization: %.2f cores, %.3f cores per Gbit/sec" % (result.cpu_cores, result.get_cpu_per_gbit()))
+            self.report_metric("TCP bandwidth", round(speed, 1), "Mb/s")
+            if speed > float(self.interface_speed) * self.bandwidth_target:
                 print("\nSuccess: Required bandwidth achieved !!")
                 return True
-            print("\nWarning: Total Bandwidth %s Mb/sec is less than %s%% of the interface speed of %s Mb/sec" % (speed, self.bandwidth_target * 100, self.interface_speed))
+            print("\nWarning: Total Bandwidth %.1f Mb/sec is less than %s%% of the interface speed of %s Mb/sec" % (speed, self.bandwidth_target * 100, self.interface_speed))
+        if self.nic_info and self.nic_info.get_warnings():
+            print("\nPossible causes:")
+            for warning in self.nic_info.get_warnings():
+                print("    %s" % warning)
         if self.enforce_speed:
             print("\nError: Could not achieve required bandwidth")
             return False
         return True
 
-    # 8
-    def udp_test(self):
-        print("Testing UDP latency to %s..." % self.test_server)
-        sys.stdout.flush()
-        try:
-            cmd_wo_port = "iperf3 -c %s -t 5 -u" % self.test_server
-            for i in range(5):
-                result = subprocess.getstatusoutput(NetworkTest.add_iperf_port(cmd_wo_port))
-                if result[0] == 0:
-                    print(result[1])
-                    break
-                print(result)
-                time.sleep(5)
-        except Exception as e:
-            print("Error: UDP latency test failed")
-            print(e)
+    def __test_all_interfaces_bandwidth(self):
+        """ measure all interfaces at the same time, each over its own source route and server ports """
+        print("Testing TCP bandwidth of %u interfaces at once to %s..." % (len(self.test_interfaces), self.test_server))
+        no_proc = int(self.no_proc)
+        engines = list()
+        for (index, (interface, address)) in enumerate(self.test_interfaces):
+            start_port = NetworkTest.iperf_port + index * no_proc
+            engines.append((interface, ThroughputEngine(self.test_server, range(start_port, start_port + no_proc),
+                                                        interface=interface, duration=self.bandwidth_duration,
+                                                        streams=self.bandwidth_streams, bind=address,
+                                                        cpu_offset=index * no_proc)))
+        results = dict()
+        threads = list()
+
+        def run_engine(interface, engine):
+            try:
+                results[interface] = engine.run()
+            except Exception as e:
+                print("Error: iperf3 clients of %s failed: %s" % (interface, e))
+                results[interface] = ThroughputResult()
+                results[interface].errors.append(str(e))
+
+        for (interface, engine) in engines:
+            thread = threading.Thread(target=run_engine, args=(interface, engine))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        NetworkTest.shared_results = results
+
+        success = True
+        below_target = list()
+        aggregate = 0.0
+        link_speeds = 0
+        for (interface, engine) in engines:
+            result = results[interface]
+            if result.errors:
+                print("Error: TCP bandwidth test of %s failed" % interface)
+                success = False
+                continue
+            link_speed = int(self.get_interface_speed(interface) or self.interface_speed)
+            speed = result.total / 1e6
+            aggregate += speed
+            link_speeds += link_speed
+            print("\n%s: %.1f Mb/sec of %s Mb/sec, %u retransmits, CPUs %s" % (interface, speed, link_speed, result.retransmits,
+                  ",".join(str(cpu) for cpu in engine.cpus)))
+            for (queue, bits) in sorted(result.queues.items()):
+                print("    Queue %s: %.1f Mb/sec" % (queue, bits / 1e6))
+            self.report_metric("TCP bandwidth %s" % interface, round(speed, 1), "Mb/s")
+            if speed <= link_speed * self.bandwidth_target:
+                print("Warning: %s reached less than %s%% of its link speed" % (interface, self.bandwidth_target * 100))
+                below_target.append(interface)
+        print("\nAggregate Bandwidth: %.1f Mb/sec of %s Mb/sec" % (aggregate, link_speeds))
+        self.report_metric("TCP bandwidth total", round(aggregate, 1), "Mb/s")
+        if below_target:
+            print("Warning: %s below target while all interfaces run at once - "
+                  "check for a shared PCIe slot, NUMA node or CPU limit" % ", ".join(below_target))
+            if self.enforce_speed:
+                print("\nError: Could not achieve required bandwidth")
+                success = False
+        return success
+
+    def report_shared_bandwidth(self):
+        """ throughput of this interface measured by an earlier instance together with the others """
+        interface = self.logical_device_name
+        result = NetworkTest.shared_results.get(interface)
+        if result is None:
+            print("Error: %s was not measured when all interfaces were tested at once" % interface)
+            return False
+        if result.errors:
+            print("Error: TCP bandwidth test of %s failed when all interfaces were tested at once" % interface)
+            return False
+        link_speed = int(self.get_interface_speed(interface) or self.interface_speed)
+        speed = result.total / 1e6
+        print("%s: %.1f Mb/sec of %s Mb/sec, %u retransmits, while all interfaces were tested at once"
+              % (interface, speed, link_speed, result.retransmits))
+        self.report_metric("TCP bandwidth", round(speed, 1), "Mb/s")
+        if speed > link_speed * self.bandwidth_target:
+            print("\nSuccess: Required bandwidth achieved !!")
+            return True
+        print("Warning: %s reached less than %s%% of its link speed" % (interface, self.bandwidth_target * 100))
+        if self.enforce_speed:
+            print("\nError: Could not achieve required bandwidth")
             return False
         return True
 
+    # 8
+    def udp_test(self):
+        return self.__test_latency("udp")
+
     # 9
     def icmp_test(self):
-        retries = 5
         packet_count = 5000
         loss_margin = 1.00
         loss_margin_error = 3.00
-        while retries > 0:
-            try:
-                ping_cmd = "/bin/ping -i 0 -q -c %u %s" % (packet_count, self.test_server)
-                print(ping_cmd)
-                ping = subprocess.getoutput(ping_cmd)
-                match = re.search(".*, (?P<packetLoss>\d+\.{0,1}\d*)% packet loss.*", ping)
-                packet_loss = match.group("packetLoss")
-                if float(packet_loss) <= loss_margin:
-                    print("SUCCESS: Packet loss of %s%% is less than %s%% expected!" % (packet_loss, loss_margin))
-                    return True
-                elif float(packet_loss) <= loss_margin_error:
-                    print("WARNING: Packet loss of %s%% is high, but less than maximum %s%% expected!" % (packet_loss, loss_margin_error))
-                    return "WARN"
-                else:
-                    print("Note: packet loss of %s%% is greater than %s%% expected" % (packet_loss, loss_margin_error))
-            except Exception as e:
-                print("Warning:")
-                print(e)
-            retries = retries -1
+        print("Sending up to %u ICMP echo requests to %s" % (packet_count, self.test_server))
+        sys.stdout.flush()
+        try:
+            prober = IcmpProber(self.test_server, count=packet_count, good_loss=loss_margin, bad_loss=loss_margin_error,
+                                source=self.get_source_address())
+            result = prober.run()
+        except OSError as e:
+            print("Error: ICMP test failed: %s" % e)
+            return False
+        result.print_report(self.test_server)
+        packet_loss = result.get_loss()
+        (lower, upper) = get_loss_interval(len(result.lost), result.sent)
+        print("Packet loss %.2f%% (95%% confidence %.2f%% - %.2f%%)" % (packet_loss, lower, upper))
+        self.report_metric("ICMP loss", round(packet_loss, 2), "%")
+        if packet_loss <= loss_margin:
+            print("SUCCESS: Packet loss of %.2f%% is less than %s%% expected!" % (packet_loss, loss_margin))
+            return True
+        elif packet_loss <= loss_margin_error:
+            print("WARNING: Packet loss of %.2f%% is high, but less than maximum %s%% expected!" % (packet_loss, loss_margin_error))
+            return "WARN"
+        print("Error: packet loss of %.2f%% is greater than %s%% expected" % (packet_loss, loss_margin_error))
         return False
-    
+
     # 10
     def stop_iperf_services_on_lts(self):
         return self.__do_iperf_action('stop')
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# NIC introspection - channels, rings, offloads, RSS, XPS/RPS and IRQ
+# affinity of every queue, with warnings on setups that cap throughput
+#
+
+import glob, os, re, subprocess
+
+from core.lib.throughput import get_interface_cpus, get_interface_numa_node, parse_cpu_list
+
+OFFLOADS = ["rx-checksumming", "tx-checksumming", "scatter-gather", "tcp-segmentation-offload",
+            "generic-segmentation-offload", "generic-receive-offload", "large-receive-offload"]
+
+
+def parse_ethtool_settings(output):
+    """ parses ethtool -g/-l output into {"maximums": {name: value}, "current": {name: value}} """
+    settings = {"maximums": dict(), "current": dict()}
+    section = None
+    for line in output.split("\n"):
+        if line.startswith("Pre-set maximums"):
+            section = "maximums"
+        elif line.startswith("Current hardware settings"):
+            section = "current"
+        elif section and ":" in line:
+            (name, value) = line.split(":", 1)
+            try:
+                settings[section][name.strip()] = int(value.strip())
+            except ValueError:
+                pass
+    return settings
+
+
+def parse_cpu_mask(text):
+    """ "00000000,0000000f" -> [0, 1, 2, 3] """
+    try:
+        mask = int(text.strip().replace(",", ""), 16)
+    except ValueError:
+        return list()
+    return [cpu for cpu in range(mask.bit_length()) if mask >> cpu & 1]
+
+
+def read_file(path):
+    try:
+        with open(path) as sysfs_file:
+            return sysfs_file.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+class NicInfo:
+    """ reads the queue and interrupt topology of interface once """
+
+    def __init__(self, interface):
+        self.interface = interface
+        self.channels = parse_ethtool_settings(self.ethtool("-l"))
+        self.rings = parse_ethtool_settings(self.ethtool("-g"))
+        self.offloads = self.get_offloads()
+        self.rss_queues = self.get_rss_queues()
+        self.queues = self.get_queue_masks()
+        self.numa_node = get_interface_numa_node(interface)
+        self.numa_cpus = get_interface_cpus(interface) if self.numa_node is not None else list()
+        self.irqs = self.get_irqs()
+
+    def ethtool(self, option):
+        (status, output) = subprocess.getstatusoutput("ethtool %s %s" % (option, self.interface))
+        if status != 0:
+            return ""
+        return output
+
+    def get_offloads(self):
+        """ returns {feature: "on"/"off"} of OFFLOADS """
+        offloads = dict()
+        for line in self.ethtool("-k").split("\n"):
+            match = re.match(r"^(?P<name>[\w\-]+):\s+(?P<state>on|off)", line)
+            if match and match.group("name") in OFFLOADS:
+                offloads[match.group("name")] = match.group("state")
+        return offloads
+
+    def get_rss_queues(self):
+        """ returns the set of queues in the RSS indirection table, None if there is none """
+        output = self.ethtool("-x")
+        queues = set()
+        for line in output.split("\n"):
+            match = re.match(r"^\s*\d+:\s+(?P<queues>[\d\s]+)$", line)
+            if match:
+                queues.update(int(queue) for queue in match.group("queues").split())
+        return queues or None
+
+    def get_queue_masks(self):
+        """ returns {queue: CPUs} of XPS (tx-N) and RPS (rx-N) from sysfs """
+        queues = dict()
+        for path in sorted(glob.glob("/sys/class/net/%s/queues/*" % self.interface)):
+            queue = os.path.basename(path)
+            mask = read_file(os.path.join(path, "xps_cpus" if queue.startswith("tx") else "rps_cpus"))
+            queues[queue] = parse_cpu_mask(mask) if mask else list()
+        return queues
+
+    def get_irqs(self):
+        """ returns {irq: (name, CPUs)} of the MSI interrupts of the device,
+        interrupts named after the interface if it has no MSI """
+        names = dict()
+        for line in (read_file("/proc/interrupts") or "").split("\n"):
+            fields = line.split()
+            if fields and fields[0].rstrip(":").isdigit():
+                names[int(fields[0].rstrip(":"))] = fields[-1]
+        numbers = [int(os.path.basename(path)) for path in glob.glob("/sys/class/net/%s/device/msi_irqs/*" % self.interface)
+                   if os.path.basename(path).isdigit()]
+        if not numbers:
+            numbers = [irq for (irq, name) in names.items() if name.startswith(self.interface)]
+        irqs = dict()
+        for irq in sorted(numbers):
+            affinity = read_file("/proc/irq/%u/smp_affinity_list" % irq)
+            irqs[irq] = (names.get(irq, "?"), parse_cpu_list(affinity) if affinity else list())
+        return irqs
+
+    def get_queue_count(self):
+        current = self.channels["current"]
+        if current:
+            return max(current.get("Combined", 0) + current.get("RX", 0), 1)
+        return max(len([queue for queue in self.queues if queue.startswith("rx")]), 1)
+
+    def get_warnings(self):
+        """ returns descriptions of settings known to cap throughput """
+        warnings = list()
+        cpu_count = os.cpu_count() or 1
+        queue_count = self.get_queue_count()
+        if queue_count == 1 and cpu_count > 1:
+            warnings.append("single receive queue - one CPU handles all received packets")
+        maximum = self.channels["maximums"].get("Combined", 0) + self.channels["maximums"].get("RX", 0)
+        if maximum > queue_count and queue_count < cpu_count:
+            warnings.append("%u of %u queues in use (ethtool -L %s combined %u)" % (
+                queue_count, maximum, self.interface, min(maximum, cpu_count)))
+        for ring in ("RX", "TX"):
+            current = self.rings["current"].get(ring)
+            maximum = self.rings["maximums"].get(ring)
+            if current and maximum and current < maximum / 4:
+                warnings.append("%s ring of %u descriptors, hardware allows %u" % (ring, current, maximum))
+        for feature in ("tcp-segmentation-offload", "generic-receive-offload"):
+            if self.offloads.get(feature) == "off":
+                warnings.append("%s is off" % feature)
+        if self.rss_queues is not None and len(self.rss_queues) < queue_count:
+            warnings.append("RSS spreads flows over %u of %u queues" % (len(self.rss_queues), queue_count))
+        if self.numa_cpus:
+            remote = [irq for (irq, (name, cpus)) in self.irqs.items() if cpus and not set(cpus) & set(self.numa_cpus)]
+            if remote:
+                warnings.append("IRQs %s run on CPUs outside NUMA node %u of the NIC" % (
+                    ",".join(str(irq) for irq in remote), self.numa_node))
+        single = set(tuple(cpus) for (name, cpus) in self.irqs.values() if len(cpus) == 1)
+        if len(self.irqs) > 1 and len(single) == 1 and all(len(cpus) == 1 for (name, cpus) in self.irqs.values()):
+            warnings.append("all %u IRQs are bound to CPU %u" % (len(self.irqs), list(single)[0][0]))
+        return warnings
+
+    def print_report(self):
+        print("NIC topology of %s:" % self.interface)
+        current = self.channels["current"]
+        if current:
+            print("    channels: %s (maximum %s)" % (
+                ", ".join("%s %u" % (name, value) for (name, value) in sorted(current.items()) if value),
+                ", ".join("%s %u" % (name, value) for (name, value) in sorted(self.channels["maximums"].items()) if value)))
+        if self.rings["current"]:
+            print("    rings: %s (maximum %s)" % (
+                ", ".join("%s %u" % (ring, self.rings["current"].get(ring, 0)) for ring in ("RX", "TX")),
+                ", ".join("%s %u" % (ring, self.rings["maximums"].get(ring, 0)) for ring in ("RX", "TX"))))
+        if self.offloads:
+            print("    offloads: %s" % ", ".join("%s %s" % (name, state) for (name, state) in sorted(self.offloads.items())))
+        if self.rss_queues is not None:
+            print("    RSS indirection table queues: %s" % ",".join(str(queue) for queue in sorted(self.rss_queues)))
+        print("    NUMA node: %s%s" % ("unknown" if self.numa_node is None else self.numa_node,
+                                      " (CPUs %s)" % ",".join(str(cpu) for cpu in self.numa_cpus) if self.numa_cpus else ""))
+        for (queue, cpus) in sorted(self.queues.items(), key=lambda item: (item[0][:2], int(item[0][3:]))):
+            print("    %s %s CPUs: %s" % (queue, "XPS" if queue.startswith("tx") else "RPS",
+                                         ",".join(str(cpu) for cpu in cpus) or "-"))
+        for (irq, (name, cpus)) in sorted(self.irqs.items()):
+            print("    IRQ %u %s CPUs: %s" % (irq, name, ",".join(str(cpu) for cpu in cpus) or "-"))
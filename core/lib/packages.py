@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Package (rpm) queries and installation for all selected tests at once
+#
+
+import os, subprocess, tempfile
+
+try:
+    import rpm
+except ImportError:
+    rpm = None
+
+
+def get_installed_packages(names):
+    """ returns the set of the given package names which are installed,
+    using a single query of the rpm database """
+    names = set(names)
+    if not names:
+        return set()
+    installed = set()
+    if rpm:
+        transaction_set = rpm.TransactionSet()
+        for header in transaction_set.dbMatch():
+            name = header["name"]
+            if isinstance(name, bytes):
+                name = name.decode("utf-8")
+            if name in names:
+                installed.add(name)
+        return installed
+    # no rpm python bindings, ask rpm once for all of them
+    output = subprocess.getoutput("rpm -q --qf '%%{NAME}\\n' %s" % " ".join(sorted(names)))
+    for line in output.split("\n"):
+        if line.strip() in names:
+            installed.add(line.strip())
+    return installed
+
+
+def get_repository_options(repository):
+    """ yum options to use only the local repository in the given directory """
+    if not repository:
+        return ""
+    return "--disablerepo='*' --repofrompath=eohc-local,%s --enablerepo=eohc-local --nogpgcheck" \
+        % os.path.abspath(repository)
+
+
+def install_packages(install=(), remove=(), repository=None):
+    """ installs the missing packages of install and removes the installed
+    packages of remove in one yum transaction, so the repository metadata
+    is loaded once. returns (status, output) """
+    wanted = set(install)
+    unwanted = set(remove) - wanted
+    installed = get_installed_packages(wanted | unwanted)
+    missing = sorted(wanted - installed)
+    harmful = sorted(unwanted & installed)
+    if not missing and not harmful:
+        return (0, "All required packages are installed")
+    if missing:
+        print("Installing packages: %s" % " ".join(missing))
+    if harmful:
+        print("Removing packages: %s" % " ".join(harmful))
+    options = get_repository_options(repository)
+    if not harmful:
+        return subprocess.getstatusoutput("sudo yum install -y %s %s" % (options, " ".join(missing)))
+    # install and remove in one transaction
+    script = tempfile.NamedTemporaryFile(mode="w", suffix=".yum", delete=False)
+    if missing:
+        script.write("install %s\n" % " ".join(missing))
+    script.write("remove %s\n" % " ".join(harmful))
+    script.write("run\n")
+    script.close()
+    try:
+        return subprocess.getstatusoutput("sudo yum shell -y %s %s" % (options, script.name))
+    finally:
+        os.remove(script.name)
+
+
+def download_packages(names, directory, releasever=None, arch=None):
+    """ downloads the given packages with all their dependencies into
+    directory, for another release and architecture if given.
+    returns (status, output) """
+    options = "--resolve --alldeps --destdir=%s" % os.path.abspath(directory)
+    if releasever:
+        options += " --releasever=%s" % releasever
+    if arch:
+        options += " --forcearch=%s" % arch
+    return subprocess.getstatusoutput("yum download -y %s %s" % (options, " ".join(sorted(names))))
+
+
+def create_repository(directory):
+    """ creates the repository metadata for the packages in directory """
+    for command in ["createrepo_c", "createrepo"]:
+        if subprocess.getstatusoutput("which %s" % command)[0] == 0:
+            return subprocess.getstatusoutput("%s %s" % (command, os.path.abspath(directory)))
+    return (1, "There is no createrepo_c or createrepo")
@@ -0,0 +1,49 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Incompressible payloads for network tests - a pseudo-random stream seeded from
+# os.urandom, written to files or streamed from memory
+#
+
+import os, random
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class PayloadGenerator:
+    """ yields incompressible data at memory speed: every chunk is fresh output
+    of a Mersenne Twister seeded from os.urandom, so neither compression nor
+    deduplication finds repeats at any window size (it is not cryptographic) """
+
+    def __init__(self, seed=None, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.random = random.Random(os.urandom(32) if seed is None else seed)
+
+    def get_chunks(self, size):
+        """ yields chunks of at most the block size, size bytes in total """
+        while size > 0:
+            length = min(size, self.block_size)
+            # getrandbits makes a whole chunk in one call (random.randbytes needs python 3.9)
+            chunk = self.random.getrandbits(length * 8).to_bytes(length, "little")
+            size -= length
+            yield chunk
+
+    def write_file(self, path, size):
+        """ writes a file of size bytes, an existing file of that size is reused """
+        try:
+            if os.path.getsize(path) == size:
+                print("Reusing %s (%u bytes)" % (path, size))
+                return True
+        except OSError:
+            pass
+        with open(path, "wb") as payload_file:
+            for chunk in self.get_chunks(size):
+                payload_file.write(chunk)
+        return True
+
+    def send(self, connection, size):
+        """ streams size bytes to a socket (or file object with write) without a file """
+        for chunk in self.get_chunks(size):
+            if hasattr(connection, "sendall"):
+                connection.sendall(chunk)
+            else:
+                connection.write(chunk)
@@ -0,0 +1,150 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Live progress of a run: status file for dashboards, ETA from earlier runs
+#
+
+import json, os, socket, threading, time
+
+HISTORY_LENGTH = 5 # durations of a test kept for its estimate
+
+
+class ProgressReporter:
+    """ keeps the state of the run (current test and sub-test, elapsed time,
+    estimates, live metrics) in a JSON status file. The file is rewritten on
+    every event and at least every heartbeat seconds - a stale file means the
+    machine is stuck. Test durations are kept in a history file for the
+    estimates of next runs """
+
+    def __init__(self, path="eohc_progress.json", history_path="eohc_history.json", heartbeat=10):
+        self.path = path
+        self.history_path = history_path
+        self.heartbeat = heartbeat
+        self.history = self.load_history()
+        self.state = None
+        self.test_started = None
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def load_history(self):
+        try:
+            history_file = open(self.history_path)
+            history = json.load(history_file)
+            history_file.close()
+            return history
+        except (IOError, OSError, ValueError):
+            return dict()
+
+    def save_history(self):
+        history_file = open(self.history_path, "w")
+        json.dump(self.history, history_file, indent=1)
+        history_file.close()
+
+    def get_estimate(self, test):
+        """ median duration of the test in earlier runs, None if it never ran """
+        durations = sorted(self.history.get(test, list()))
+        if not durations:
+            return None
+        return durations[len(durations) // 2]
+
+    def start_run(self, tests):
+        with self.lock:
+            self.state = {"host": socket.gethostname(), "pid": os.getpid(), "started": time.time(),
+                          "tests": [{"name": test, "estimate": self.get_estimate(test), "result": None}
+                                    for test in tests],
+                          "test": None, "sub_test": None, "metrics": dict(), "finished": False}
+        self.write()
+        self.running = True
+        self.thread = threading.Thread(target=self.__beat)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            if self.state:
+                self.state["finished"] = True
+                self.state["test"] = None
+                self.state["sub_test"] = None
+        self.write()
+
+    def start_test(self, test):
+        self.test_started = time.time()
+        with self.lock:
+            self.state["test"] = test
+            self.state["test_started"] = self.test_started
+            self.state["sub_test"] = None
+            self.state["metrics"] = dict()
+        self.write()
+
+    def start_sub_test(self, name):
+        if not self.state:
+            return
+        with self.lock:
+            self.state["sub_test"] = name
+        self.write()
+
+    def report_metric(self, name, value, unit=""):
+        if not self.state:
+            return
+        with self.lock:
+            self.state["metrics"][name] = {"value": value, "unit": unit, "time": time.time()}
+        self.write()
+
+    def finish_test(self, test, result):
+        duration = time.time() - self.test_started
+        with self.lock:
+            for entry in self.state["tests"]:
+                if entry["name"] == test:
+                    entry["result"] = str(result)
+                    entry["duration"] = duration
+            self.state["test"] = None
+            self.state["sub_test"] = None
+        self.write()
+        self.history[test] = (self.history.get(test, list()) + [duration])[-HISTORY_LENGTH:]
+        self.save_history()
+
+    def get_eta(self):
+        """ returns (seconds left of the current test, seconds left of the run),
+        None where some estimate is not known """
+        test_left = None
+        run_left = 0
+        now = time.time()
+        for entry in self.state["tests"]:
+            if entry["result"] is not None:
+                continue
+            left = entry["estimate"]
+            if left is not None and entry["name"] == self.state["test"]:
+                left = max(0, left - (now - self.state["test_started"]))
+                test_left = left
+            if left is None or run_left is None:
+                run_left = None
+            else:
+                run_left += left
+        return (test_left, run_left)
+
+    def write(self):
+        """ replace the status file atomically, readers never see a partial file """
+        with self.lock:
+            if not self.state:
+                return
+            self.state["updated"] = time.time()
+            (self.state["test_eta"], self.state["run_eta"]) = self.get_eta()
+            text = json.dumps(self.state, indent=1)
+        temporary = self.path + ".tmp"
+        try:
+            status_file = open(temporary, "w")
+            status_file.write(text)
+            status_file.close()
+            os.rename(temporary, self.path)
+        except (IOError, OSError):
+            pass
+
+    def __beat(self):
+        while self.running:
+            time.sleep(1)
+            if time.time() - self.state.get("updated", 0) >= self.heartbeat:
+                self.write()
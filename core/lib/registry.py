@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Registry of EOHC tests, read from the test sources without importing them
+#
+
+import ast, glob, os
+
+
+class TestRegistry:
+    """ finds tests/<name>/<name>.py files and reads the metadata of their
+    <Name>Test class (interactive, priority, description, resources,
+    required and harmful rpms) from the source, so that nothing is imported or
+    instantiated until the test is about to run """
+
+    metadata_attributes = ["interactive", "priority", "description", "resources"]
+
+    def __init__(self, main_path):
+        self.main_path = main_path
+        self.tests = dict()
+        self.__discover()
+
+    def __discover(self):
+        for file in sorted(glob.glob(os.path.join(self.main_path, "tests", "*", "*.py"))):
+            name = os.path.basename(file)[:-3]
+            if name != os.path.basename(os.path.dirname(file)):
+                # only <name>/<name>.py holds a test
+                continue
+            info = {
+                "name": name,
+                "file": file,
+                "import_path": "tests.%s.%s" % (name, name),
+                "class": name.capitalize() + "Test",
+                "interactive": False,
+                "priority": 5,
+                "description": "",
+                "resources": list(),
+                "required_rpms": list(),
+                "harmful_rpms": list(),
+            }
+            try:
+                self.__read_metadata(info)
+            except (SyntaxError, ValueError, OSError) as e:
+                print("Warning: could not read metadata of %s" % file)
+                print(e)
+            self.tests[name] = info
+
+    def __read_metadata(self, info):
+        source = open(info["file"]).read()
+        classes = dict()
+        for node in ast.parse(source, info["file"]).body:
+            if isinstance(node, ast.ClassDef):
+                classes[node.name] = node
+        if info["class"] not in classes:
+            return
+        # base classes from the same module first, so the test class overrides them
+        hierarchy = list()
+        node = classes[info["class"]]
+        while node and node not in hierarchy:
+            hierarchy.insert(0, node)
+            bases = [base.id for base in node.bases if isinstance(base, ast.Name)]
+            node = None
+            for base in bases:
+                if base in classes:
+                    node = classes[base]
+                    break
+        for node in hierarchy:
+            for method in node.body:
+                if not isinstance(method, ast.FunctionDef):
+                    continue
+                if method.name == "__init__":
+                    self.__read_attributes(method, info)
+                elif method.name == "get_required_rpms":
+                    info["required_rpms"] = self.__read_rpms(method)
+                elif method.name == "get_harmful_rpms":
+                    info["harmful_rpms"] = self.__read_rpms(method)
+
+    def __read_attributes(self, method, info):
+        for statement in ast.walk(method):
+            if not isinstance(statement, ast.Assign):
+                continue
+            for target in statement.targets:
+                if isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) \
+                        and target.value.id == "self" and target.attr in self.metadata_attributes:
+                    try:
+                        info[target.attr] = ast.literal_eval(statement.value)
+                    except ValueError:
+                        # not a constant, known only after import
+                        pass
+
+    def __read_rpms(self, method):
+        """ returns the list of rpms if get_required_rpms() (or
+        get_harmful_rpms()) returns a constant list, otherwise None - the test must be imported to ask it """
+        body = [statement for statement in method.body if not isinstance(statement, ast.Expr)]
+        if len(body) == 1 and isinstance(body[0], ast.Return):
+            try:
+                rpms = ast.literal_eval(body[0].value)
+                if isinstance(rpms, list):
+                    return rpms
+            except ValueError:
+                pass
+        return None
+
+    def get_names(self):
+        return sorted(self.tests.keys())
+
+    def get_info(self, name):
+        return self.tests[name]
+
+    def get_run_order(self, names):
+        """ interactive tests first, then by priority (lowest first) """
+        ordered = sorted(names, key=lambda name: self.tests[name]["priority"])
+        return sorted(ordered, key=lambda name: self.tests[name]["interactive"], reverse=True)
+
+    def load(self, name):
+        """ import the test module and return an instance of its test class """
+        info = self.tests[name]
+        module = __import__(info["import_path"], globals(), locals(), [info["class"]], 0)
+        return getattr(module, info["class"])()
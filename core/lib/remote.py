@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Runs EOHC on many machines over SSH and collects their results
+#
+
+import json, os, shlex, shutil, subprocess, sys, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+
+# files of a run collected from every host
+RESULT_FILES = ["output.html", "eohc.log", "eohc_status.json", "eohc_run.journal", "eohc_progress.json"]
+# not pushed to the hosts
+PUSH_EXCLUDES = [".git", "__pycache__", "*.pyc", ".eohc_build", "eohc_history.json", "eohc_results"] + RESULT_FILES
+
+
+class RemoteHost:
+    """ one machine under test, reached by ssh. All commands share one
+    connection (ssh ControlMaster), opened by open() and closed by close() """
+
+    ssh = "ssh"
+
+    def __init__(self, address, control_dir):
+        # user@host:port
+        self.address = address
+        (self.host, _, port) = address.partition(":")
+        self.port = port or None
+        self.control_path = os.path.join(control_dir, "%r@%h:%p")
+
+    def get_name(self):
+        return self.address.replace("/", "_")
+
+    def get_ssh_command(self):
+        command = [self.ssh, "-o", "ControlMaster=auto", "-o", "ControlPath=%s" % self.control_path,
+                   "-o", "ControlPersist=600", "-o", "BatchMode=yes"]
+        if self.port:
+            command += ["-p", self.port]
+        return command + [self.host]
+
+    def open(self):
+        """ start the master connection, returns (status, output) """
+        return self.call(["-M", "-N", "-f"], None)
+
+    def close(self):
+        return self.call(["-O", "exit"], None)
+
+    def call(self, options, command):
+        ssh = self.get_ssh_command()
+        ssh = ssh[:-1] + options + ssh[-1:]
+        if command:
+            ssh.append(command)
+        process = subprocess.run(ssh, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                 stdin=subprocess.DEVNULL, universal_newlines=True)
+        return (process.returncode, process.stdout)
+
+    def run(self, command):
+        """ run a shell command on the host, returns (status, output) """
+        return self.call([], command)
+
+    def stream(self, command, callback):
+        """ run a shell command on the host, calling callback for every line of its
+        output as soon as it arrives, returns the exit status """
+        process = subprocess.Popen(self.get_ssh_command() + [command], stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                   universal_newlines=True, errors="replace")
+        for line in process.stdout:
+            callback(line.rstrip("\n"))
+        return process.wait()
+
+    def push(self, local_directory, remote_directory, excludes=()):
+        """ copy local_directory into remote_directory with one tar stream """
+        excludes = " ".join("--exclude=%s" % shlex.quote(exclude) for exclude in excludes)
+        remote = " ".join(shlex.quote(part) for part in self.get_ssh_command())
+        command = "tar -C %s %s -czf - . | %s %s" % (shlex.quote(local_directory), excludes, remote,
+            shlex.quote("mkdir -p %s && tar -C %s -xzf -" % (remote_directory, remote_directory)))
+        return subprocess.getstatusoutput(command)
+
+    def put(self, local_file, remote_file):
+        """ copy one file to the host """
+        remote = " ".join(shlex.quote(part) for part in self.get_ssh_command())
+        command = "%s %s < %s" % (remote, shlex.quote("mkdir -p %s && cat > %s" % (
+            os.path.dirname(remote_file), remote_file)), shlex.quote(local_file))
+        return subprocess.getstatusoutput(command)
+
+    def fetch(self, remote_directory, files, local_directory):
+        """ copy files of remote_directory into local_directory, missing files are skipped """
+        if not os.path.isdir(local_directory):
+            os.makedirs(local_directory)
+        remote = " ".join(shlex.quote(part) for part in self.get_ssh_command())
+        names = " ".join(shlex.quote(file) for file in files)
+        command = "%s %s | tar -C %s -xzf -" % (remote,
+            shlex.quote("cd %s && tar -czf - $(ls %s 2>/dev/null)" % (remote_directory, names)),
+            shlex.quote(local_directory))
+        return subprocess.getstatusoutput(command)
+
+
+class RemoteOrchestrator:
+    """ pushes the EOHC tree to the hosts, runs start_headless.py on at most
+    max_parallel of them at once, prints their output prefixed by the host
+    name and collects the results into store/<host>/ """
+
+    def __init__(self, main_path, addresses, store, max_parallel=4, remote_directory="/var/lib/eohc",
+                 progress_interval=15):
+        self.main_path = main_path
+        self.progress_interval = progress_interval # seconds between progress fetches
+        self.store = os.path.abspath(store)
+        self.max_parallel = max_parallel
+        self.remote_directory = remote_directory
+        self.control_dir = tempfile.mkdtemp(prefix="eohc-ssh-")
+        self.hosts = [RemoteHost(address, self.control_dir) for address in addresses]
+        self.lock = threading.Lock()
+
+    def print_line(self, host, line):
+        with self.lock:
+            print("[%s] %s" % (host.address, line))
+            sys.stdout.flush()
+
+    def run_host(self, host, profile, answers=None, bundle=None, resume=False, collect_only=False):
+        """ returns the status dict of the host run or None if it could not run """
+        (status, output) = host.open()
+        if status != 0:
+            self.print_line(host, "Error: could not connect")
+            self.print_line(host, output.strip())
+            return None
+        try:
+            if not collect_only:
+                if not self.push_run(host, profile, answers, bundle, resume):
+                    return None
+            (status, output) = host.fetch(self.remote_directory, RESULT_FILES,
+                                          os.path.join(self.store, host.get_name()))
+            if status != 0:
+                self.print_line(host, "Warning: could not collect all results")
+                self.print_line(host, output.strip())
+            return self.load_status(host)
+        finally:
+            host.close()
+
+    def push_run(self, host, profile, answers, bundle, resume):
+        self.print_line(host, "Pushing EOHC to %s" % self.remote_directory)
+        (status, output) = host.push(self.main_path, self.remote_directory, PUSH_EXCLUDES)
+        if status == 0:
+            (status, output) = host.put(profile, self.remote_directory + "/profile/profile.json")
+        if status == 0 and answers:
+            (status, output) = host.put(answers, self.remote_directory + "/profile/answers.json")
+        if status == 0 and bundle:
+            (status, output) = host.push(bundle, self.remote_directory + "/bundle")
+        if status != 0:
+            self.print_line(host, "Error: could not push EOHC")
+            self.print_line(host, output.strip())
+            return False
+        options = "--profile profile/profile.json"
+        if answers:
+            options += " --answers profile/answers.json"
+        if bundle:
+            options += " --offline bundle"
+        if not resume:
+            # results of an earlier run stay on the host, do not resume it
+            options += " --restart"
+        command = "cd %s && if [ $(id -u) -ne 0 ]; then SUDO='sudo -n'; fi; $SUDO python3 start_headless.py %s" \
+            % (self.remote_directory, options)
+        # fetch the progress file for show_progress.py while the run goes on
+        finished = threading.Event()
+        poller = threading.Thread(target=self.poll_progress, args=(host, finished))
+        poller.daemon = True
+        poller.start()
+        status = host.stream(command, lambda line: self.print_line(host, line))
+        finished.set()
+        poller.join()
+        self.print_line(host, "Finished with exit status %u" % status)
+        return True
+
+    def poll_progress(self, host, finished):
+        while not finished.wait(self.progress_interval):
+            host.fetch(self.remote_directory, ["eohc_progress.json"], os.path.join(self.store, host.get_name()))
+
+    def load_status(self, host):
+        try:
+            status_file = open(os.path.join(self.store, host.get_name(), "eohc_status.json"))
+            status = json.load(status_file)
+            status_file.close()
+            return status
+        except (IOError, OSError, ValueError):
+            return None
+
+    def run(self, profile, answers=None, bundle=None, resume=False, collect_only=False):
+        """ returns {host address: status dict or None} """
+        results = dict()
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+            futures = {host.address: executor.submit(self.run_host, host, profile, answers, bundle,
+                                                      resume, collect_only)
+                       for host in self.hosts}
+            for (address, future) in futures.items():
+                try:
+                    results[address] = future.result()
+                except (IOError, OSError) as e:
+                    print("Error: %s: %s" % (address, e))
+                    results[address] = None
+        shutil.rmtree(self.control_dir, ignore_errors=True)
+        return results
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Per-interface source routing - lets several NICs on the same network reach
+# the test server at once, each over its own link, without touching the main table
+#
+
+import subprocess
+
+TABLE_BASE = 200 # routing tables of the interfaces are TABLE_BASE + index
+RULE_PRIORITY = 1000
+
+
+class SourceRoutes:
+    """ for every added interface: a routing table with the route to the
+    destination over that interface, a rule selecting the table for packets
+    from the interface address, and ARP settings so each address answers on
+    its own interface only. remove() restores everything """
+
+    sysctls = {"arp_ignore": "1", "arp_announce": "2", "rp_filter": "2"}
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.interfaces = list() # (interface, address, table)
+        self.saved_sysctls = dict()
+
+    def run(self, command):
+        (status, output) = subprocess.getstatusoutput(command)
+        if status != 0:
+            print("Error: %s: %s" % (command, output))
+            return False
+        return True
+
+    def set_sysctl(self, name, value):
+        path = "/proc/sys/net/ipv4/conf/%s" % name.replace(".", "/")
+        try:
+            with open(path) as sysctl_file:
+                self.saved_sysctls.setdefault(path, sysctl_file.read().strip())
+            with open(path, "w") as sysctl_file:
+                sysctl_file.write(value)
+        except (IOError, OSError) as e:
+            print("Warning: could not set %s: %s" % (path, e))
+
+    def add(self, interface, address):
+        """ route packets from address to the destination over interface """
+        table = TABLE_BASE + len(self.interfaces)
+        for (name, value) in SourceRoutes.sysctls.items():
+            self.set_sysctl("%s.%s" % (interface, name), value)
+        if not self.run("ip route replace %s dev %s src %s table %u" % (self.destination, interface, address, table)):
+            return False
+        if not self.run("ip rule add from %s lookup %u priority %u" % (address, table, RULE_PRIORITY + len(self.interfaces))):
+            self.run("ip route flush table %u" % table)
+            return False
+        self.interfaces.append((interface, address, table))
+        print("Packets from %s go to %s over %s (table %u)" % (address, self.destination, interface, table))
+        return True
+
+    def remove(self, sig=None, frame=None):
+        success = True
+        for (interface, address, table) in self.interfaces:
+            success = self.run("ip rule del from %s lookup %u" % (address, table)) and success
+            success = self.run("ip route flush table %u" % table) and success
+        self.interfaces = list()
+        for (path, value) in self.saved_sysctls.items():
+            try:
+                with open(path, "w") as sysctl_file:
+                    sysctl_file.write(value)
+            except (IOError, OSError) as e:
+                print("Warning: could not restore %s: %s" % (path, e))
+        self.saved_sysctls = dict()
+        return success
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Journal of a certification run, used to resume it after reboot or crash
+#
+
+import json, os, time
+
+
+class RunJournal:
+    """ append-only journal of the planned tests, test starts and test results.
+    Every event is written as one JSON line and fsynced, so the state of the
+    run survives reboots, kernel panics and power loss """
+
+    def __init__(self, path="eohc_run.journal"):
+        self.path = path
+        self.max_attempts = 2 # a test interrupted this often is failed
+
+    def __append(self, event, mode="a"):
+        event["time"] = time.time()
+        journal = open(self.path, mode)
+        journal.write(json.dumps(event) + "\n")
+        journal.flush()
+        os.fsync(journal.fileno())
+        journal.close()
+
+    def start_run(self, tests):
+        """ begin a new run of the given tests, dropping any previous run """
+        self.__append({"event": "plan", "tests": list(tests)}, mode="w")
+
+    def start_test(self, name):
+        self.__append({"event": "start", "test": name})
+
+    def finish_test(self, name, result):
+        self.__append({"event": "finish", "test": name, "result": str(result)})
+
+    def load(self):
+        """ returns the state of the last run:
+        {"plan": [tests], "started": {test: attempts}, "finished": {test: result}}
+        or None if there is no journal """
+        try:
+            journal = open(self.path)
+        except (IOError, OSError):
+            return None
+        state = {"plan": list(), "started": dict(), "finished": dict()}
+        for line in journal:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # last line may be torn by a power loss
+                continue
+            if event.get("event") == "plan":
+                state["plan"] = event["tests"]
+            elif event.get("event") == "start":
+                state["started"][event["test"]] = state["started"].get(event["test"], 0) + 1
+            elif event.get("event") == "finish":
+                state["finished"][event["test"]] = event["result"]
+        journal.close()
+        return state
+
+    def is_complete(self, state=None):
+        if state is None:
+            state = self.load()
+        if not state:
+            return True
+        for test in state["plan"]:
+            if test not in state["finished"]:
+                return False
+        return True
+
+    def get_remaining_tests(self):
+        """ returns the planned tests which did not finish yet, in plan order.
+        A test that was started max_attempts times without finishing (it
+        crashed or hung the system each time) is recorded as failed instead """
+        state = self.load()
+        if not state:
+            return list()
+        remaining = list()
+        for test in state["plan"]:
+            if test in state["finished"]:
+                continue
+            if state["started"].get(test, 0) >= self.max_attempts:
+                print("Error: test %s was interrupted %u times" % (test, state["started"][test]))
+                self.finish_test(test, "FAIL")
+                continue
+            remaining.append(test)
+        return remaining
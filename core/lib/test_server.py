@@ -0,0 +1,233 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Lab test server for network tests - runs on a peer machine of the bench
+# (or in a network namespace) and serves iperf3, HTTP and echo endpoints
+#
+
+import json, os, re, socket, socketserver, subprocess, threading, time
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+from core.lib.payload import PayloadGenerator
+
+CONTROL_PORT = 5200
+ECHO_PORT = 5300
+HTTP_PORT = 8080
+
+
+class LabTestServer:
+    """ serves the endpoints network tests use:
+    - control port: JSON line requests to start/stop iperf3 servers per port
+    - iperf3 servers, each one a process of its own port; a port is leased
+      for lease seconds and stopped if the client does not stop it
+    - TCP and UDP echo (request/response latency)
+    - HTTP file server, /payload/<bytes> streams incompressible data from memory """
+
+    def __init__(self, bind="0.0.0.0", control_port=CONTROL_PORT, echo_port=ECHO_PORT,
+                 http_port=HTTP_PORT, http_root=None, lease=3600):
+        self.bind = bind
+        self.control_port = control_port
+        self.echo_port = echo_port
+        self.http_port = http_port
+        self.http_root = http_root or os.getcwd()
+        self.lease = lease
+        self.iperf = dict() # port: (process, lease end)
+        self.lock = threading.Lock()
+        self.servers = list()
+
+    # iperf3 servers
+    def start_iperf(self, ports):
+        """ start an iperf3 server on every port which has none running,
+        renews the lease of running ones. returns the ports that run """
+        running = list()
+        with self.lock:
+            for port in ports:
+                port = int(port)
+                if port in self.iperf and self.iperf[port][0].poll() is None:
+                    self.iperf[port] = (self.iperf[port][0], time.time() + self.lease)
+                    running.append(port)
+                    continue
+                try:
+                    process = subprocess.Popen(["iperf3", "-s", "-B", self.bind, "-p", str(port)],
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                except OSError as e:
+                    print("Error: could not start iperf3 on port %u: %s" % (port, e))
+                    continue
+                self.iperf[port] = (process, time.time() + self.lease)
+                running.append(port)
+                print("iperf3 started on port %u" % port)
+        return running
+
+    def stop_iperf(self, ports=None):
+        """ stop the iperf3 servers of the given ports (all if None) """
+        with self.lock:
+            if ports is None:
+                ports = list(self.iperf.keys())
+            for port in ports:
+                port = int(port)
+                if port not in self.iperf:
+                    continue
+                (process, lease_end) = self.iperf.pop(port)
+                if process.poll() is None:
+                    process.terminate()
+                    try:
+                        process.wait(timeout=5)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                print("iperf3 stopped on port %u" % port)
+
+    def get_iperf_ports(self):
+        with self.lock:
+            return sorted(port for (port, (process, lease_end)) in self.iperf.items() if process.poll() is None)
+
+    def expire_leases(self):
+        now = time.time()
+        with self.lock:
+            expired = [port for (port, (process, lease_end)) in self.iperf.items() if lease_end < now]
+        if expired:
+            print("Leases of ports %s expired" % expired)
+            self.stop_iperf(expired)
+
+    def handle_request(self, request):
+        """ handle one control request, returns the response """
+        action = request.get("action")
+        if action == "ping":
+            return {"status": "ok"}
+        if action == "start_iperf":
+            ports = self.start_iperf(request.get("ports", list()))
+            return {"status": "ok" if ports else "error", "ports": ports}
+        if action == "stop_iperf":
+            self.stop_iperf(request.get("ports"))
+            return {"status": "ok"}
+        if action == "status":
+            return {"status": "ok", "iperf": self.get_iperf_ports(), "echo": self.echo_port,
+                    "http": self.http_port}
+        return {"status": "error", "error": "unknown action %s" % action}
+
+    # servers
+    def serve(self):
+        """ run all endpoints until interrupted """
+        server = self
+
+        class ControlHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        response = server.handle_request(json.loads(line.decode("utf-8")))
+                    except ValueError as e:
+                        response = {"status": "error", "error": str(e)}
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+        class TCPEchoHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                while True:
+                    data = self.request.recv(65536)
+                    if not data:
+                        break
+                    self.request.sendall(data)
+
+        class UDPEchoHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                (data, sock) = self.request
+                sock.sendto(data, self.client_address)
+
+        payload = PayloadGenerator()
+
+        class HTTPHandler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                match = re.match(r"^/payload/(?P<size>\d+)$", self.path)
+                if not match:
+                    return SimpleHTTPRequestHandler.do_GET(self)
+                size = int(match.group("size"))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(size))
+                self.end_headers()
+                try:
+                    payload.send(self.wfile, size)
+                except (IOError, OSError):
+                    # client closed the connection
+                    pass
+
+            def translate_path(self, path):
+                # python 3.6 has no directory argument, serve http_root instead of cwd
+                path = SimpleHTTPRequestHandler.translate_path(self, path)
+                return os.path.join(server.http_root, os.path.relpath(path, os.getcwd()))
+
+            def log_message(self, format, *args):
+                pass
+
+        class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.servers = [ThreadingTCPServer((self.bind, self.control_port), ControlHandler),
+                        ThreadingTCPServer((self.bind, self.echo_port), TCPEchoHandler),
+                        socketserver.UDPServer((self.bind, self.echo_port), UDPEchoHandler),
+                        ThreadingHTTPServer((self.bind, self.http_port), HTTPHandler)]
+        for endpoint in self.servers:
+            thread = threading.Thread(target=endpoint.serve_forever)
+            thread.daemon = True
+            thread.start()
+        print("Lab test server on %s: control %u, echo %u (tcp/udp), http %u (%s)"
+              % (self.bind, self.control_port, self.echo_port, self.http_port, self.http_root))
+        try:
+            while True:
+                time.sleep(10)
+                self.expire_leases()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for endpoint in self.servers:
+            endpoint.shutdown()
+            endpoint.server_close()
+        self.servers = list()
+        self.stop_iperf()
+
+
+class TestServerClient:
+    """ client of the control port of a LabTestServer """
+
+    def __init__(self, host, port=CONTROL_PORT, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def request(self, action, **arguments):
+        """ returns the response or None if the server can not be reached """
+        arguments["action"] = action
+        try:
+            connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            try:
+                connection.sendall((json.dumps(arguments) + "\n").encode("utf-8"))
+                response = connection.makefile("rb").readline()
+            finally:
+                connection.close()
+            return json.loads(response.decode("utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def is_available(self):
+        response = self.request("ping")
+        return bool(response) and response.get("status") == "ok"
+
+    def start_iperf(self, ports):
+        """ returns the ports running iperf3 on the server """
+        response = self.request("start_iperf", ports=list(ports))
+        if not response:
+            return list()
+        return response.get("ports", list())
+
+    def stop_iperf(self, ports):
+        response = self.request("stop_iperf", ports=list(ports))
+        return bool(response) and response.get("status") == "ok"
+
+    def get_status(self):
+        return self.request("status")
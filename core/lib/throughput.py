@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# TCP throughput engine: concurrent iperf3 clients in JSON mode, pinned to
+# the CPUs of the NIC's NUMA node, with per-stream, per-queue and CPU reporting
+#
+
+import json, os, re, subprocess, time
+
+
+def parse_cpu_list(text):
+    """ "0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11] """
+    cpus = list()
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            (first, last) = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def get_interface_numa_node(interface):
+    """ returns the NUMA node of the NIC or None (no NUMA or virtual device) """
+    try:
+        node = int(open("/sys/class/net/%s/device/numa_node" % interface).read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+    if node < 0:
+        return None
+    return node
+
+
+def get_interface_cpus(interface):
+    """ returns the CPUs of the NIC's NUMA node, all online CPUs if unknown """
+    node = get_interface_numa_node(interface)
+    if node is not None:
+        try:
+            return parse_cpu_list(open("/sys/devices/system/node/node%u/cpulist" % node).read())
+        except (IOError, OSError, ValueError):
+            pass
+    return sorted(os.sched_getaffinity(0))
+
+
+def read_queue_counters(interface):
+    """ returns {queue name: bytes} from the per-queue counters of ethtool -S,
+    e.g. {"tx-0": 123, "rx-0": 456}. The counter names depend on the driver:
+    tx_queue_0_bytes, tx-0.bytes, rx0_bytes, queue_0_tx_bytes... """
+    counters = dict()
+    (status, output) = subprocess.getstatusoutput("ethtool -S %s" % interface)
+    if status != 0:
+        return counters
+    patterns = [re.compile(r"^\s*(?P<direction>rx|tx)[_\-]?(?:queue[_\-]?)?(?P<queue>\d+)[_\.](?:rx_|tx_)?bytes\s*:\s*(?P<value>\d+)"),
+                re.compile(r"^\s*queue[_\-]?(?P<queue>\d+)[_\-](?P<direction>rx|tx)[_\-]bytes\s*:\s*(?P<value>\d+)")]
+    for line in output.split("\n"):
+        for pattern in patterns:
+            match = pattern.match(line)
+            if match:
+                counters["%s-%s" % (match.group("direction"), match.group("queue"))] = int(match.group("value"))
+                break
+    return counters
+
+
+class ThroughputResult:
+    """ result of one measurement: streams [(port, stream id, bits/s)],
+    total bits/s, CPU used by the clients (in cores) and queue counters """
+
+    def __init__(self):
+        self.streams = list()
+        self.total = 0.0
+        self.cpu_cores = 0.0
+        self.retransmits = 0
+        self.queues = dict()
+        self.errors = list()
+
+    def get_cpu_per_gbit(self):
+        """ CPU cores the clients used per Gbit/s of throughput """
+        if not self.total:
+            return None
+        return self.cpu_cores / (self.total / 1e9)
+
+
+class ThroughputEngine:
+    """ runs one iperf3 client per server port at the same time, each pinned to
+    a CPU of the NIC's NUMA node, and sums their JSON results. A failed
+    measurement (server busy, connection refused) is retried at most retries times """
+
+    def __init__(self, server, ports, interface=None, duration=10, streams=1, zero_copy=True,
+                 retries=3, reverse=False, bind=None, cpu_offset=0):
+        self.server = server
+        self.ports = list(ports)
+        self.interface = interface
+        self.duration = duration
+        self.streams = streams # parallel streams of each client
+        self.zero_copy = zero_copy # sendfile() instead of write()
+        self.retries = retries
+        self.reverse = reverse
+        self.bind = bind # source address, selects the NIC when several reach the server
+        self.cpu_offset = cpu_offset # first CPU used, engines running at once do not share CPUs
+        self.cpus = get_interface_cpus(interface) if interface else sorted(os.sched_getaffinity(0))
+
+    def get_command(self, port, cpu):
+        command = ["iperf3", "-c", self.server, "-p", str(port), "-J", "-t", str(self.duration),
+                   "-P", str(self.streams), "-A", str(cpu)]
+        if self.zero_copy:
+            command.append("-Z")
+        if self.reverse:
+            command.append("-R")
+        if self.bind:
+            command.extend(["-B", self.bind])
+        return command
+
+    def run_once(self):
+        result = ThroughputResult()
+        queues_before = read_queue_counters(self.interface) if self.interface else dict()
+        clients = list()
+        for (index, port) in enumerate(self.ports):
+            cpu = self.cpus[(self.cpu_offset + index) % len(self.cpus)]
+            try:
+                clients.append((port, subprocess.Popen(self.get_command(port, cpu), stdout=subprocess.PIPE,
+                                                       stderr=subprocess.STDOUT, universal_newlines=True)))
+            except OSError as e:
+                result.errors.append("port %u: %s" % (port, e))
+        for (port, client) in clients:
+            (output, _) = client.communicate()
+            try:
+                report = json.loads(output)
+            except ValueError:
+                result.errors.append("port %u: %s" % (port, output.strip()[-200:]))
+                continue
+            if "error" in report:
+                result.errors.append("port %u: %s" % (port, report["error"]))
+                continue
+            end = report.get("end", dict())
+            for stream in end.get("streams", list()):
+                side = stream.get("receiver") or stream.get("sender") or dict()
+                result.streams.append((port, side.get("socket"), side.get("bits_per_second", 0.0)))
+            result.total += end.get("sum_received", end.get("sum_sent", dict())).get("bits_per_second", 0.0)
+            result.retransmits += end.get("sum_sent", dict()).get("retransmits", 0)
+            result.cpu_cores += end.get("cpu_utilization_percent", dict()).get("host_total", 0.0) / 100
+        if self.interface:
+            queues_after = read_queue_counters(self.interface)
+            for (queue, value) in queues_after.items():
+                if queue in queues_before and value > queues_before[queue]:
+                    result.queues[queue] = (value - queues_before[queue]) * 8.0 / self.duration
+        return result
+
+    def run(self):
+        """ returns the ThroughputResult of all ports, errors of the last attempt included """
+        for attempt in range(self.retries):
+            result = self.run_once()
+            if not result.errors:
+                return result
+            print("Warning: iperf3 attempt %u of %u failed: %s" % (attempt + 1, self.retries, "; ".join(result.errors)))
+            time.sleep(1)
+        return result
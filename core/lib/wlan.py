@@ -0,0 +1,301 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# WLAN benchmark - throughput and latency of a wireless link, with signal,
+# bitrate and MCS sampled from `iw link` while it runs
+#
+
+import os, re, subprocess, threading, time
+
+from core.lib.icmp import IcmpProber
+from core.lib.latency import LatencyResult
+from core.lib.throughput import ThroughputEngine
+
+
+def parse_iw_link(output):
+    """ returns {"freq", "signal", "tx bitrate", "rx bitrate", "mode", "mcs", "nss", "width"}
+    of `iw dev <interface> link`, an empty dictionary when not connected """
+    link = dict()
+    if not output.startswith("Connected"):
+        return link
+    for line in output.split("\n"):
+        (name, _, value) = line.strip().partition(":")
+        value = value.strip()
+        if name == "freq":
+            link["freq"] = float(value.split()[0])
+        elif name == "signal":
+            link["signal"] = int(value.split()[0])
+        elif name in ("tx bitrate", "rx bitrate"):
+            link[name] = float(value.split()[0])
+            if name == "tx bitrate":
+                # e.g. 1201.0 MBit/s 80MHz HE-MCS 11 HE-NSS 2 HE-GI 0 HE-DCM 0
+                match = re.search(r"\b(?:(?P<mode>EHT|HE|VHT)-)?MCS (?P<mcs>\d+)", value)
+                if match:
+                    link["mode"] = match.group("mode") or "HT"
+                    link["mcs"] = int(match.group("mcs"))
+                    if link["mode"] == "HT":
+                        # HT MCS 0-31 also encode the spatial streams
+                        link["nss"] = link["mcs"] // 8 + 1
+                        link["mcs"] = link["mcs"] % 8
+                else:
+                    link["mode"] = "legacy"
+                match = re.search(r"\b(?:EHT|HE|VHT)-NSS (?P<nss>\d+)", value)
+                if match:
+                    link["nss"] = int(match.group("nss"))
+                match = re.search(r"(?P<width>\d+)MHz", value)
+                link["width"] = int(match.group("width")) if match else 20
+    return link
+
+
+def get_band(freq):
+    if freq is None:
+        return "unknown"
+    if freq < 3000:
+        return "2.4 GHz"
+    if freq < 5925:
+        return "5 GHz"
+    return "6 GHz"
+
+
+def get_median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[len(values) // 2]
+
+
+def get_correlation(xs, ys):
+    """ Pearson correlation of two lists, None if it can not be computed """
+    if len(xs) < 3 or len(xs) != len(ys):
+        return None
+    mean_x = sum(xs) / float(len(xs))
+    mean_y = sum(ys) / float(len(ys))
+    covariance = sum((x - mean_x) * (y - mean_y) for (x, y) in zip(xs, ys))
+    spread_x = sum((x - mean_x) ** 2 for x in xs) ** 0.5
+    spread_y = sum((y - mean_y) ** 2 for y in ys) ** 0.5
+    if not spread_x or not spread_y:
+        return None
+    return covariance / (spread_x * spread_y)
+
+
+class WirelessCapabilities:
+    """ what a wireless phy supports, from one `iw phy <phy> info` call and sysfs:
+    bands {"2.4 GHz": {"ht", "vht", "he", "eht", "short_gi_80", "54mbps"}} and product name """
+
+    def __init__(self, phy):
+        self.phy = phy
+        self.bands = dict()
+        self.product = self.read_product()
+        self.parse(subprocess.getoutput("iw phy %s info" % phy))
+
+    def parse(self, output):
+        features = None
+        for line in output.split("\n"):
+            stripped = line.strip()
+            if re.match(r"^Band \d+:", stripped):
+                # renamed after its first frequency
+                band = stripped.rstrip(":")
+                features = set()
+                self.bands[band] = features
+            elif features is None:
+                continue
+            elif not line.startswith("\t\t"):
+                # end of the bands (supported commands, interface combinations...)
+                features = None
+            elif stripped.startswith("Capabilities: 0x"):
+                features.add("ht")
+            elif stripped.startswith("VHT Capabilities"):
+                features.add("vht")
+            elif stripped.startswith("HE Iftypes") or stripped.startswith("HE PHY Capabilities"):
+                features.add("he")
+            elif stripped.startswith("EHT Iftypes") or stripped.startswith("EHT PHY Capabilities"):
+                features.add("eht")
+            elif "short GI (80 MHz)" in stripped:
+                features.add("short_gi_80")
+            elif stripped.startswith("* 54.0 Mbps"):
+                features.add("54mbps")
+            elif band.startswith("Band") and re.match(r"^\* \d+(\.\d+)? MHz", stripped):
+                self.bands[get_band(float(stripped.split()[1]))] = self.bands.pop(band)
+                band = get_band(float(stripped.split()[1]))
+
+    def read_product(self):
+        """ vendor and model of the device from the udev hardware database """
+        properties = dict()
+        output = subprocess.getoutput("udevadm info -q property -p /sys/class/ieee80211/%s/device" % self.phy)
+        for line in output.split("\n"):
+            (name, _, value) = line.partition("=")
+            properties[name] = value
+        return " ".join(properties[name] for name in ("ID_VENDOR_FROM_DATABASE", "ID_MODEL_FROM_DATABASE")
+                        if properties.get(name))
+
+    def supports(self, feature):
+        return any(feature in features for features in self.bands.values())
+
+
+_capabilities = dict() # phy: WirelessCapabilities
+
+
+def get_wireless_capabilities(phy):
+    """ returns the WirelessCapabilities of phy, read once per run """
+    if phy not in _capabilities:
+        _capabilities[phy] = WirelessCapabilities(phy)
+    return _capabilities[phy]
+
+
+def get_interface_phy(interface):
+    """ returns the phy of a wireless interface or None """
+    try:
+        with open("/sys/class/net/%s/phy80211/name" % interface) as phy_file:
+            return phy_file.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def get_phy_list():
+    return sorted(os.listdir("/sys/class/ieee80211")) if os.path.isdir("/sys/class/ieee80211") else list()
+
+
+class LinkSampler:
+    """ samples `iw link` and the byte counters of interface every interval
+    seconds in a thread; every sample holds the throughput since the last one """
+
+    def __init__(self, interface, interval=1.0):
+        self.interface = interface
+        self.interval = interval
+        self.samples = list()
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def read_bytes(self):
+        total = 0
+        for counter in ("rx_bytes", "tx_bytes"):
+            try:
+                with open("/sys/class/net/%s/statistics/%s" % (self.interface, counter)) as counter_file:
+                    total += int(counter_file.read())
+            except (IOError, OSError, ValueError):
+                pass
+        return total
+
+    def sample(self):
+        previous = (time.time(), self.read_bytes())
+        while not self.stopping.wait(self.interval):
+            link = parse_iw_link(subprocess.getoutput("iw dev %s link" % self.interface))
+            now = (time.time(), self.read_bytes())
+            link["throughput"] = (now[1] - previous[1]) * 8 / 1e6 / (now[0] - previous[0])
+            previous = now
+            if "signal" in link:
+                self.samples.append(link)
+
+    def start(self):
+        self.samples = list()
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.sample)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        return self.samples
+
+
+class WlanBenchmark:
+    """ measures upload and download throughput (iperf3) and ICMP latency of
+    the current connection of interface, sampling the link meanwhile """
+
+    weak_signal = -67 # dBm
+    strong_signal = -55 # dBm
+    low_efficiency = 0.35 # throughput / PHY bitrate
+
+    def __init__(self, interface, server, ports, duration=20):
+        self.interface = interface
+        self.server = server
+        self.ports = list(ports)
+        self.duration = duration
+        self.results = list() # {"direction", "throughput", "samples"}
+        self.latency = None
+
+    def run(self):
+        """ returns False if nothing could be measured """
+        sampler = LinkSampler(self.interface)
+        for (direction, reverse) in (("upload", False), ("download", True)):
+            engine = ThroughputEngine(self.server, self.ports, interface=self.interface,
+                                      duration=self.duration, reverse=reverse)
+            sampler.start()
+            result = engine.run()
+            samples = sampler.stop()
+            if result.errors:
+                print("Error: %s measurement failed: %s" % (direction, "; ".join(result.errors)))
+                continue
+            self.results.append({"direction": direction, "throughput": result.total / 1e6, "samples": samples})
+        try:
+            icmp = IcmpProber(self.server, count=300, window=1)
+            self.latency = LatencyResult(icmp.run().rtts)
+        except OSError as e:
+            print("Warning: latency not measured: %s" % e)
+        return bool(self.results)
+
+    def get_link(self):
+        """ returns the most common band, width, mode and NSS of the samples """
+        samples = [sample for result in self.results for sample in result["samples"]]
+        link = dict()
+        for name in ("freq", "width", "mode", "nss"):
+            values = [sample[name] for sample in samples if name in sample]
+            link[name] = max(set(values), key=values.count) if values else None
+        link["band"] = get_band(link["freq"])
+        return link
+
+    def print_report(self):
+        link = self.get_link()
+        print("Band %s, channel width %s MHz, %s, %s spatial streams" % (
+            link["band"], link["width"] or "?", link["mode"] or "?", link["nss"] or "?"))
+        for result in self.results:
+            samples = result["samples"]
+            bitrate_name = "tx bitrate" if result["direction"] == "upload" else "rx bitrate"
+            bitrate = get_median([sample[bitrate_name] for sample in samples if bitrate_name in sample])
+            signal = get_median([sample["signal"] for sample in samples])
+            print("\n%s: %.1f Mb/sec, median signal %s dBm, median %s %s Mb/sec" % (
+                result["direction"].capitalize(), result["throughput"], signal, bitrate_name, bitrate))
+            if bitrate:
+                print("    %.0f%% of the PHY rate" % (result["throughput"] * 100 / bitrate))
+            mcs = [sample["mcs"] for sample in samples if "mcs" in sample]
+            if mcs:
+                print("    tx MCS: %s" % ", ".join("%u (%u)" % (value, mcs.count(value)) for value in sorted(set(mcs))))
+            throughput = [sample["throughput"] for sample in samples]
+            for (name, values) in (("signal", [sample["signal"] for sample in samples]),
+                                   (bitrate_name, [sample.get(bitrate_name, 0) for sample in samples])):
+                correlation = get_correlation(throughput, values)
+                if correlation is not None:
+                    print("    correlation of throughput with %s: %.2f" % (name, correlation))
+            print("    %8s %8s %10s %4s %12s" % ("time", "signal", "bitrate", "MCS", "throughput"))
+            for (index, sample) in enumerate(samples):
+                print("    %7us %4s dBm %5s Mb/s %4s %7.1f Mb/s" % (index + 1, sample["signal"], sample.get(bitrate_name, "?"),
+                                                               sample.get("mcs", "-"), sample["throughput"]))
+        if self.latency and self.latency.samples:
+            print("\nLatency: p50 %.1f ms, p99 %.1f ms, jitter %.1f ms" % (
+                self.latency.get_percentile(50) / 1000, self.latency.get_percentile(99) / 1000,
+                (self.latency.get_jitter() or 0) / 1000))
+
+    def get_warnings(self, required_support=None):
+        """ returns signs of a link below what the card should do, e.g. antenna problems """
+        warnings = list()
+        link = self.get_link()
+        samples = [sample for result in self.results for sample in result["samples"]]
+        signal = get_median([sample["signal"] for sample in samples])
+        expected_modes = {"ax": ["HE", "EHT"], "ac": ["VHT", "HE", "EHT"]}
+        if required_support in expected_modes and link["mode"] not in expected_modes[required_support]:
+            warnings.append("connected as %s, not 802.11%s - check the access point and band" % (link["mode"], required_support))
+        if signal is not None and signal < WlanBenchmark.weak_signal:
+            warnings.append("weak signal of %s dBm - check antenna cables and their routing in the chassis" % signal)
+        mcs = get_median([sample["mcs"] for sample in samples if "mcs" in sample])
+        if signal is not None and signal >= WlanBenchmark.strong_signal and mcs is not None and mcs < 7:
+            warnings.append("MCS %u at a strong signal of %s dBm - a damaged or detuned antenna" % (mcs, signal))
+        if link["nss"] == 1 and link["mode"] in ("VHT", "HE", "EHT"):
+            warnings.append("single spatial stream - one antenna may be disconnected")
+        for result in self.results:
+            bitrate_name = "tx bitrate" if result["direction"] == "upload" else "rx bitrate"
+            bitrate = get_median([sample[bitrate_name] for sample in result["samples"] if bitrate_name in sample])
+            if bitrate and result["throughput"] < bitrate * WlanBenchmark.low_efficiency:
+                warnings.append("%s throughput is %.0f%% of the PHY rate" % (result["direction"], result["throughput"] * 100 / bitrate))
+        return warnings
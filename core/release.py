@@ -123,24 +123,31 @@ class EuroLinuxRelease(Release):
         Release.__init__(self, "/etc/redhat-release")
         self.kernel = None
         self.arch = None
+        self.os_release = dict()
+        self.__read_os_release("/etc/os-release")
+        if not self.text and "NAME" in self.os_release and "VERSION_ID" in self.os_release:
+            # no redhat-release, build the same text from os-release
+            self.text = "%s release %s" % (self.os_release["NAME"], self.os_release["VERSION_ID"])
+            self.parse()
         if self.is_valid():
             self.__get_kernel_info()
 
+    def __read_os_release(self, file):
+        try:
+            f = open(file)
+            for line in f:
+                pair = line.strip().split("=", 1)
+                if len(pair) == 2:
+                    self.os_release[pair[0]] = pair[1].strip("\"'")
+            f.close()
+        except:
+            pass
+
     def __get_kernel_info(self):
-        uname = os.popen('uname -r')
-        self.kernel = uname.readline()[:-1]
-        uname.close()
-        uname = os.popen('uname -m')
-        self.arch = uname.readline()[:-1]
-        uname.close()
-        uname = os.popen("uname -r")
-        uname_output = uname.readline()
-        uname.close()
-        if not uname_output:
-            print("Error: uname failed")
-        else:
-            uname_output = uname_output.strip()
-        self.get_product_from_uname(uname_output)
+        uname = os.uname()
+        self.kernel = uname.release
+        self.arch = uname.machine
+        self.get_product_from_uname(self.kernel)
 
     def get_product_from_uname(self, uname_output):
         pattern = re.compile(
@@ -168,3 +175,35 @@ class EuroLinuxRelease(Release):
         Release.dump(self)
         print("Kernel Version \"" + self.get_kernel() + "\"")
         print("Architecture \"" + self.get_arch() + "\"")
+
+
+class TargetRelease(Release):
+    """ release of another machine given by its version and architecture,
+    e.g. the tested machine of an offline bundle built elsewhere """
+
+    def __init__(self, releasever, arch, product="EuroLinux"):
+        Release.__init__(self, None)
+        self.text = "%s release %s" % (product, releasever)
+        self.parse()
+        self.kernel = None
+        self.arch = arch
+
+    def get_kernel(self): return self.kernel
+    def get_arch(self): return self.arch
+
+
+_release = None
+
+def set_release(release):
+    """ makes release the one returned by get_release(), e.g. a TargetRelease
+    to evaluate tests for another machine """
+    global _release
+    _release = release
+
+def get_release():
+    """ returns the EuroLinuxRelease of this system - it is created once and
+    shared by everything in the process """
+    global _release
+    if _release is None:
+        _release = EuroLinuxRelease()
+    return _release
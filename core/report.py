@@ -2,7 +2,7 @@
 # Author: Radoslaw Kolba
 #
 import os, sys, shutil, re, rpm, subprocess
-from core.release import EuroLinuxRelease
+from core.release import get_release
 
 class GenerateSystemReport():
 
@@ -78,7 +78,7 @@ class GenerateSystemReport():
 
         # skip ebpf plugin in certain conditions, to avoid kernel-taint
         sos_version = self.get_sos_version()
-        skip_ebpf = "-n ebpf" if int(EuroLinuxRelease().get_version()) == 7 and float(sos_version.split('-')[1]) >= 3.9 else ""
+        skip_ebpf = "-n ebpf" if int(get_release().get_version()) == 7 and float(sos_version.split('-')[1]) >= 3.9 else ""
 
         result = self._processSystemReport("sosreport --batch -n selinux -n logs --log-size {0} {1}".format(log_size, skip_ebpf))
         return result
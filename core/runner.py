@@ -0,0 +1,223 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Runs selected EOHC tests - shared by the interactive and the headless entry points
+#
+
+import json, subprocess, sys
+from core.test import Test, TestResult
+from core.lib.registry import TestRegistry
+from core.lib.kmsg import KernelLogWatcher
+from core.lib.run_journal import RunJournal
+from core.lib.build import HelperBuilder
+from core.lib.packages import install_packages
+from core.lib.progress import ProgressReporter
+
+# exit status of a run, by its combined result
+EXIT_STATUS = {TestResult.PASS: 0, TestResult.WARN: 1, TestResult.REVIEW: 2, TestResult.FAIL: 3}
+
+
+# Class to redirect stdout into given file
+class Tee(object):
+    def __init__(self, *files):
+        self.files = files
+    def write(self, obj):
+        for f in self.files:
+            f.write(obj)
+            # whole lines only - print() writes the text and its newline separately
+            if "\n" in obj:
+                f.flush()
+    def flush(self):
+        for f in self.files:
+            if not f.closed:
+                f.flush()
+
+
+class Runner:
+    """ runs the selected tests: installs their packages, builds their helpers,
+    runs them in order with the kernel log watched and journals every result.
+    parameters are test attributes set before the test is planned and run:
+    {test name: {attribute: value}}, "*" applies to every test having the attribute """
+
+    def __init__(self, main_path, repository=None, parameters=None):
+        self.main_path = main_path
+        self.repository = repository
+        self.parameters = parameters or dict()
+        self.journal = RunJournal()
+        self.registry = TestRegistry(main_path)
+        self.helper_builder = HelperBuilder(main_path)
+        self.loaded_tests = dict()
+        self.log_file = None
+        self.progress = ProgressReporter()
+
+    def get_test_names(self):
+        return self.registry.get_names()
+
+    def get_default_tests(self):
+        """ all tests but reboot """
+        return [name for name in self.get_test_names() if name != "reboot"]
+
+    def can_resume(self):
+        return not self.journal.is_complete()
+
+    def get_remaining_tests(self):
+        return [test for test in self.journal.get_remaining_tests() if test in self.registry.tests]
+
+    def start(self, tests):
+        """ begin a new run of tests - reset all output and journal the selection """
+        subprocess.getoutput("cp -f " + self.main_path + "/core/static/base.html output.html")
+        self.journal.start_run(tests)
+        output = open('output.html', 'a')
+        output.write("<info>Selected EOHC tests:</info>")
+        output.write("<tests>")
+        for test in self.get_test_names():
+            selected = ""
+            if test in tests:
+                selected = " class=\"selected\""
+            output.write("<test%s>%s</test>" % (selected, test))
+        output.write("</tests>")
+        output.write("<info>Results:</info>")
+        output.close()
+
+    def install_packages(self, tests):
+        """ collect required and harmful packages of all tests and install/remove
+        them in one transaction - yum loads repositories once """
+        required_rpms = set()
+        harmful_rpms = set()
+        if self.helper_builder.get_directories(tests):
+            required_rpms.update(["gcc", "make"])
+        for test_name in tests:
+            info = self.registry.get_info(test_name)
+            if info["required_rpms"] is None or info["harmful_rpms"] is None:
+                # package lists depend on the hardware, ask the test itself
+                try:
+                    self.loaded_tests[test_name] = self.registry.load(test_name)
+                except ImportError:
+                    # reported when the test is about to run
+                    continue
+                required_rpms.update(self.loaded_tests[test_name].get_required_rpms())
+                harmful_rpms.update(self.loaded_tests[test_name].get_harmful_rpms())
+            else:
+                required_rpms.update(info["required_rpms"])
+                harmful_rpms.update(info["harmful_rpms"])
+        required_rpms.discard("")
+        (status, info) = install_packages(required_rpms, harmful_rpms, self.repository)
+        if status != 0:
+            print("Warning: could not install all required packages")
+            print(info)
+
+    def open_log(self, append=False):
+        """ redirect stdout into log file """
+        if append:
+            self.log_file = open('eohc.log', 'a')
+        else:
+            self.log_file = open('eohc.log', 'w')
+        sys.stdout = Tee(sys.stdout, self.log_file)
+
+    def close_log(self):
+        sys.stdout = sys.__stdout__
+        self.log_file.close()
+        self.log_file = None
+
+    def build_helpers(self, tests):
+        """ build helper binaries in parallel - unchanged ones are cached.
+        returns the tests that can run, a test whose helpers do not build is failed """
+        tests = list(tests)
+        for (test_name, (status, info)) in sorted(self.helper_builder.build(tests).items()):
+            if status == "failed":
+                print("Error: could not build helpers of %s test, it will not run" % test_name)
+                print(info)
+                tests.remove(test_name)
+                self.journal.finish_test(test_name, "FAIL")
+            elif status == "built":
+                print("Built helpers of %s test" % test_name)
+        return tests
+
+    def apply_parameters(self, test_name, test):
+        for (attribute, value) in self.parameters.get("*", dict()).items():
+            if hasattr(test, attribute):
+                setattr(test, attribute, value)
+        for (attribute, value) in self.parameters.get(test_name, dict()).items():
+            setattr(test, attribute, value)
+
+    def run_test(self, test_name):
+        """ import, plan and run one test, returns its result """
+        import_path = self.registry.get_info(test_name)["import_path"]
+        try:
+            # import the test and create an instance of its class right before it runs
+            if test_name in self.loaded_tests:
+                test_class = self.loaded_tests.pop(test_name)
+            else:
+                test_class = self.registry.load(test_name)
+            print("Successfully imported ", import_path)
+        except ImportError as e:
+            print("Error importing ", import_path)
+            print(e)
+            return "FAIL"
+        self.apply_parameters(test_name, test_class)
+        inside_tests = test_class.plan()
+        result = TestResult()
+        for inside_test in inside_tests:
+            self.apply_parameters(test_name, inside_test)
+            value = inside_test.run()
+            if str(value) not in [TestResult.PASS, TestResult.WARN, TestResult.REVIEW, TestResult.FAIL]:
+                value = bool(value)
+            result.combine(value)
+        if not inside_tests:
+            result = "SKIP"
+        return result
+
+    def run(self, tests, resume=False, catch_errors=False):
+        """ run tests in order - interactive first, then by priority.
+        With catch_errors an exception fails the test instead of the run """
+        self.install_packages(tests)
+        self.open_log(append=resume)
+        tests = self.build_helpers(tests)
+
+        kernel_log_watcher = KernelLogWatcher()
+        if kernel_log_watcher.start():
+            Test.kernel_log_watcher = kernel_log_watcher
+
+        run_order = self.registry.get_run_order(tests)
+        self.progress.start_run(run_order)
+        Test.progress = self.progress
+
+        # every start and result is journaled, so an interrupted run can be resumed
+        for test_name in run_order:
+            self.journal.start_test(test_name)
+            self.progress.start_test(test_name)
+            try:
+                result = self.run_test(test_name)
+            except Exception as e:
+                if not catch_errors:
+                    raise
+                print("Error: %s test failed with %s: %s" % (test_name, type(e).__name__, e))
+                result = "FAIL"
+            self.journal.finish_test(test_name, result)
+            self.progress.finish_test(test_name, result)
+        kernel_log_watcher.stop()
+        Test.kernel_log_watcher = None
+        self.progress.stop()
+        Test.progress = None
+        self.close_log()
+
+    def get_status(self):
+        """ returns the machine-readable status of the last run:
+        {"result": combined result, "complete": bool, "tests": {test: result}} """
+        state = self.journal.load() or {"plan": list(), "finished": dict()}
+        result = TestResult()
+        tests = dict()
+        for test in state["plan"]:
+            tests[test] = state["finished"].get(test)
+            if tests[test] in EXIT_STATUS:
+                result.combine(tests[test])
+        complete = self.journal.is_complete(state)
+        if not complete:
+            result.combine(TestResult.FAIL)
+        return {"result": str(result), "complete": complete, "tests": tests}
+
+    def write_status(self, path):
+        status = self.get_status()
+        status_file = open(path, "w")
+        json.dump(status, status_file, indent=1)
+        status_file.close()
+        return status
@@ -8,17 +8,25 @@ import re
 import subprocess
 import sys
 import time
-from core.release import EuroLinuxRelease
+from core.release import get_release
+from core.lib.packages import install_packages
 
 
 class Test:
+    # KernelLogWatcher shared by all tests, started by the runner
+    kernel_log_watcher = None
+    # ProgressReporter of the run, set by the runner
+    progress = None
+
     def __init__(self, path):
         self.path = path
         # self.priority = 999
         self.description = ""
-        self.release = EuroLinuxRelease()
+        self.release = get_release()
         self.interactive = False
+        self.resources = list() # hardware the test occupies, e.g. "disk", "network"
         self.marking = False # is <output> sub-section currently active?
+        self.kernel_log_mark = 0
         self.result = False
         self.test_time = 0
         self.params = ""
@@ -48,10 +56,10 @@ class Test:
         returns a list of package names"""
         return list()
 
-    def install_rpms(self, rpms):
-        """ performs installation of given rpms """
-        str_rpms = " ".join(rpms)
-        return subprocess.getstatusoutput("sudo yum install -y %s" % str_rpms)[0]
+    def install_rpms(self, rpms, harmful=(), repository=None):
+        """ performs installation of given rpms which are not installed yet
+        (and removal of installed harmful rpms) in one yum transaction """
+        return install_packages(rpms, harmful, repository)[0]
 
     def start(self):
         """ performs any initialization before the test is to be run """
@@ -236,12 +244,15 @@ class Test:
                 self.nfs_root_system = True
                 break
 
-    def run_sub_test(self, subtest_function, name, description=None, params=""):
+    def run_sub_test(self, subtest_function, name, description=None, params="", expected_kernel_log=()):
+        """ expected_kernel_log: kernel log categories the sub-test causes on purpose,
+        e.g. ("link_down",) when it takes links down """
         self.mark_output(name, description)
         if params == "":
             result = subtest_function()
         else:
             result = subtest_function(params)
+        result = self.check_kernel_log(result, expected_kernel_log)
         self.mark_summary(result)
         self.close_output()
         return result
@@ -257,6 +268,30 @@ class Test:
             output.write("\t%s:\n" % name)
         output.close()
         self.marking = True
+        if Test.progress:
+            Test.progress.start_sub_test(name)
+        if Test.kernel_log_watcher:
+            Test.kernel_log_watcher.set_context("%s: %s" % (self.get_path(), name))
+            self.kernel_log_mark = Test.kernel_log_watcher.get_mark()
+
+    def report_metric(self, name, value, unit=""):
+        """ show a live value (bandwidth, temperature...) in the progress of the run """
+        if Test.progress:
+            Test.progress.report_metric(name, value, unit)
+
+    def check_kernel_log(self, result, expected=()):
+        """ combine the result of a sub-test with the kernel log hits
+        seen by the kernel log watcher while it was running """
+        if not Test.kernel_log_watcher:
+            return result
+        verdict = Test.kernel_log_watcher.get_result(self.kernel_log_mark, expected)
+        if verdict == TestResult.FAIL:
+            print("Error: kernel reported hardware errors during this sub-test")
+            return False
+        if verdict == TestResult.REVIEW and TestResult(result) == TestResult.PASS:
+            print("Needs Review: kernel reported problems during this sub-test")
+            return TestResult.REVIEW
+        return result
 
     def mark_summary(self, summary, path=""):
         summary = str(TestResult(summary))
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Live view of EOHC runs - one line per machine from their eohc_progress.json
+# files (local run, or eohc_results/<host>/ collected by start_remote.py)
+#
+import argparse
+import glob
+import json
+import sys
+import time
+
+parser = argparse.ArgumentParser(description="Live progress of EOHC runs")
+parser.add_argument("files", nargs="*", help="progress files (default: eohc_progress.json eohc_results/*/eohc_progress.json)")
+parser.add_argument("--interval", type=float, default=2, help="refresh interval in seconds (default: %(default)s)")
+parser.add_argument("--stale", type=float, default=90, help="seconds without update to show a machine as STUCK (default: %(default)s)")
+parser.add_argument("--once", action="store_true", help="print the status once and exit")
+arguments = parser.parse_args()
+
+
+def format_time(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    return "%u:%02u:%02u" % (seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def get_files():
+    if arguments.files:
+        return arguments.files
+    return glob.glob("eohc_progress.json") + sorted(glob.glob("eohc_results/*/eohc_progress.json"))
+
+
+def get_line(path, now):
+    try:
+        progress_file = open(path)
+        state = json.load(progress_file)
+        progress_file.close()
+    except (IOError, OSError, ValueError):
+        return "%-20s could not read %s" % (path, path)
+    done = len([test for test in state["tests"] if test["result"] is not None])
+    failed = [test["name"] for test in state["tests"] if test["result"] == "FAIL"]
+    if state["finished"]:
+        status = "DONE"
+    elif now - state["updated"] > arguments.stale:
+        # no heartbeat - hung or rebooted
+        status = "STUCK"
+    elif state["test_eta"] == 0:
+        # running longer than ever before
+        status = "SLOW"
+    else:
+        status = "RUNNING"
+    current = state["test"] or "-"
+    if state["sub_test"]:
+        current += ": " + state["sub_test"]
+    elapsed = None
+    if state.get("test_started") and state["test"]:
+        elapsed = state["updated"] - state["test_started"]
+    metrics = ", ".join("%s %s%s" % (name, metric["value"], metric["unit"])
+                        for (name, metric) in sorted(state["metrics"].items()))
+    line = "%-20s %-8s %2u/%-2u %-36s %8s %8s %8s" % (state["host"][:20], status, done, len(state["tests"]),
+                                                    current[:36], format_time(elapsed),
+                                                    format_time(state["test_eta"]), format_time(state["run_eta"]))
+    if failed:
+        line += "  FAIL: " + ",".join(failed)
+    if metrics:
+        line += "  " + metrics
+    return line
+
+
+while True:
+    now = time.time()
+    lines = ["%-20s %-8s %5s %-36s %8s %8s %8s" % ("HOST", "STATUS", "TESTS", "TEST: SUB-TEST", "ELAPSED",
+                                                   "TEST ETA", "RUN ETA")]
+    for path in get_files():
+        lines.append(get_line(path, now))
+    if arguments.once:
+        print("\n".join(lines))
+        break
+    # clear screen and redraw
+    sys.stdout.write("\033[H\033[2J" + "\n".join(lines) + "\n")
+    sys.stdout.flush()
+    try:
+        time.sleep(arguments.interval)
+    except KeyboardInterrupt:
+        break
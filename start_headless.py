@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Unattended EOHC run: tests, parameters and answers to the questions of
+# interactive tests come from a profile, the exit status is the result
+#
+import argparse
+import json
+import os
+import sys
+from core.release import get_release
+from core.runner import Runner, EXIT_STATUS
+from core.lib.bundle import Bundle
+from core.lib.command_line import set_answers
+
+# exit status when the run could not start
+EXIT_ERROR = 4
+
+
+def load_json(path, what):
+    try:
+        json_file = open(path)
+        value = json.load(json_file)
+        json_file.close()
+        return value
+    except (IOError, OSError, ValueError) as e:
+        print("Error: could not read %s %s" % (what, path))
+        print(e)
+        sys.exit(EXIT_ERROR)
+
+
+parser = argparse.ArgumentParser(description="Unattended EuroLinux Open Hardware Certification",
+                                 epilog="exit status: 0 PASS, 1 WARN, 2 REVIEW, 3 FAIL or unfinished, 4 error")
+parser.add_argument("--profile", required=True,
+                    help="JSON profile: {\"tests\": [...], \"parameters\": {test: {attribute: value}}, \"answers\": {...}}")
+parser.add_argument("--answers", default=None,
+                    help="JSON answer file {part of the question: answer}, merged over the profile answers")
+parser.add_argument("--repo", default=None, help="install required packages only from the local repository in REPO")
+parser.add_argument("--offline", default=None, metavar="BUNDLE",
+                    help="install required packages only from BUNDLE made by build_bundle.py")
+parser.add_argument("--status", default="eohc_status.json", help="machine-readable status file (default: %(default)s)")
+parser.add_argument("--restart", action="store_true", help="start a new run even if the previous run did not finish")
+arguments = parser.parse_args()
+
+main_path = os.path.dirname(os.path.realpath(__file__))
+profile = load_json(arguments.profile, "profile")
+answers = profile.get("answers", dict())
+if arguments.answers:
+    answers.update(load_json(arguments.answers, "answer file"))
+# nobody is there to answer - questions without an answer fail their test
+set_answers(answers)
+
+repository = arguments.repo or profile.get("repository")
+if arguments.offline:
+    bundle = Bundle(arguments.offline)
+    if not bundle.check(get_release()):
+        sys.exit(EXIT_ERROR)
+    repository = bundle.repository
+
+runner = Runner(main_path, repository=repository, parameters=profile.get("parameters"))
+if runner.can_resume() and not arguments.restart:
+    tests = runner.get_remaining_tests()
+    print("Resuming tests: %s" % ", ".join(tests))
+    runner.run(tests, resume=True, catch_errors=True)
+else:
+    tests = profile.get("tests", runner.get_default_tests())
+    unknown = [test for test in tests if test not in runner.get_test_names()]
+    if unknown:
+        print("Error: unknown tests in profile: %s" % ", ".join(unknown))
+        sys.exit(EXIT_ERROR)
+    runner.start(tests)
+    runner.run(tests, catch_errors=True)
+
+status = runner.write_status(arguments.status)
+print("EOHC result: %s" % status["result"])
+sys.exit(EXIT_STATUS[status["result"]])
@@ -0,0 +1,52 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Runs EOHC unattended on many machines over SSH and collects their results
+#
+import argparse
+import os
+import sys
+from core.test import TestResult
+from core.runner import EXIT_STATUS
+from core.lib.remote import RemoteOrchestrator
+
+parser = argparse.ArgumentParser(description="EuroLinux Open Hardware Certification of many machines over SSH",
+                                 epilog="exit status is the worst result of all hosts, as of start_headless.py")
+parser.add_argument("--hosts", required=True, help="file with one [user@]host[:port] per line")
+parser.add_argument("--profile", required=True, help="JSON profile for start_headless.py")
+parser.add_argument("--answers", default=None, help="JSON answer file for start_headless.py")
+parser.add_argument("--offline", default=None, metavar="BUNDLE", help="push BUNDLE and install packages only from it")
+parser.add_argument("--store", default="eohc_results", help="directory for results of all hosts (default: %(default)s)")
+parser.add_argument("--parallel", type=int, default=4, help="hosts tested at once (default: %(default)s)")
+parser.add_argument("--remote-dir", default="/var/lib/eohc",
+                    help="EOHC directory on the hosts, must survive a reboot (default: %(default)s)")
+parser.add_argument("--resume", action="store_true", help="resume unfinished runs on the hosts instead of starting new ones")
+parser.add_argument("--collect", action="store_true", help="only collect results, e.g. after the reboot test")
+arguments = parser.parse_args()
+
+main_path = os.path.dirname(os.path.realpath(__file__))
+addresses = list()
+for line in open(arguments.hosts):
+    line = line.split("#")[0].strip()
+    if line:
+        addresses.append(line)
+
+orchestrator = RemoteOrchestrator(main_path, addresses, arguments.store, max_parallel=arguments.parallel,
+                                  remote_directory=arguments.remote_dir)
+results = orchestrator.run(arguments.profile, arguments.answers, arguments.offline,
+                           resume=arguments.resume, collect_only=arguments.collect)
+
+print("\nResults (in %s):" % orchestrator.store)
+worst = TestResult()
+exit_status = 0
+for address in addresses:
+    status = results.get(address)
+    if status is None:
+        print("    %-32s ERROR" % address)
+        exit_status = 4
+        continue
+    state = ""
+    if not status["complete"]:
+        state = " (unfinished)"
+    print("    %-32s %s%s" % (address, status["result"], state))
+    worst.combine(status["result"])
+sys.exit(max(exit_status, EXIT_STATUS[str(worst)]))
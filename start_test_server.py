@@ -0,0 +1,25 @@
+#!/usr/bin/python3
+# Author: Radoslaw Kolba
+# Lab test server for EOHC network tests. Run it on a peer machine connected
+# to the tested NIC and point the tests to it: export EOHC_TEST_SERVER=<address>
+#
+import argparse
+import signal
+import sys
+from core.lib.test_server import LabTestServer, CONTROL_PORT, ECHO_PORT, HTTP_PORT
+
+parser = argparse.ArgumentParser(description="EOHC lab test server (iperf3, echo and HTTP endpoints)")
+parser.add_argument("--bind", default="0.0.0.0", help="address to listen on (default: %(default)s)")
+parser.add_argument("--control-port", type=int, default=CONTROL_PORT, help="control port (default: %(default)s)")
+parser.add_argument("--echo-port", type=int, default=ECHO_PORT, help="TCP and UDP echo port (default: %(default)s)")
+parser.add_argument("--http-port", type=int, default=HTTP_PORT, help="HTTP port (default: %(default)s)")
+parser.add_argument("--http-root", default=None, help="directory served over HTTP (default: current directory)")
+parser.add_argument("--lease", type=int, default=3600,
+                    help="seconds an iperf3 port runs unless the test stops it (default: %(default)s)")
+arguments = parser.parse_args()
+
+# stop the iperf3 servers when stopped by systemd or kill
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+LabTestServer(arguments.bind, arguments.control_port, arguments.echo_port, arguments.http_port,
+              arguments.http_root, arguments.lease).serve()
@@ -5,6 +5,7 @@
 import sys
 import subprocess
 import inspect
+import glob
 import os
 from distutils.version import LooseVersion
 
@@ -12,7 +13,6 @@ directory = os.path.abspath('../..')
 sys.path.append(directory)
 
 from core.controller import Controller
-from core.release import EuroLinuxRelease
 from core.test import Test
 
 
@@ -21,11 +21,11 @@ class CpuTest(Test):
 
     def __init__(self):
         Test.__init__(self, "cpu")
-        self.release = EuroLinuxRelease()
         self.stress = "stress-ng" if LooseVersion(
             self.release.get_version_point_update()) >= LooseVersion("8.6") else "stress"
         self.interactive = False
         self.priority = 5 # medium
+        self.resources = ["cpu", "memory"]
 
     def get_required_rpms(self):
         rpms = list()
@@ -52,7 +52,7 @@ class CpuTest(Test):
     def get_clock_info(self):
         print("Clock Info: ------------------------------------------")
         controller = Controller()
-        clock_info = controller.get_system_log_since_boot()
+        clock_info = controller.iter_system_log_since_boot()
         tsc = False
         clocksource = None
         for line in clock_info:
@@ -108,6 +108,18 @@ class CpuTest(Test):
             print(e)
             return False
 
+    def get_max_temperature(self):
+        """ returns the highest thermal zone temperature in C, None if unknown """
+        temperatures = list()
+        for zone in glob.glob("/sys/class/thermal/thermal_zone*/temp"):
+            try:
+                temperatures.append(int(open(zone).read().strip()) / 1000.0)
+            except (IOError, OSError, ValueError):
+                pass
+        if not temperatures:
+            return None
+        return max(temperatures)
+
     def run_stress(self):
         try:
             limit = 10  # min.
@@ -120,9 +132,23 @@ class CpuTest(Test):
                     number_of_processes, process_size, self.free_memory))
 
             print("Running %s for %u min." % (self.stress, limit))
-            stress = subprocess.getstatusoutput("%s --cpu %u --io %u --vm %u --vm-bytes %uM --timeout %um" % (
-                self.stress, number_of_processes, number_of_processes, number_of_processes, process_size, limit))
-            if stress[0] == 0:
+            stress = subprocess.Popen("%s --cpu %u --io %u --vm %u --vm-bytes %uM --timeout %um" % (
+                self.stress, number_of_processes, number_of_processes, number_of_processes, process_size, limit),
+                shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # show the temperature while the stress runs
+            highest = None
+            while True:
+                try:
+                    stress.wait(timeout=5)
+                    break
+                except subprocess.TimeoutExpired:
+                    temperature = self.get_max_temperature()
+                    if temperature is not None:
+                        self.report_metric("temperature", temperature, "C")
+                        highest = max(highest or temperature, temperature)
+            if highest is not None:
+                print("Highest temperature: %.1f C" % highest)
+            if stress.returncode == 0:
                 return True
             else:
                 return False
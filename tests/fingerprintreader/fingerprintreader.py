@@ -15,7 +15,6 @@ sys.path.append(directory)
 
 from core.lib.command_line import prompt_confirm
 from core.test import Test
-from core.release import EuroLinuxRelease
 
 
 class FingerprintreaderTest(Test):
@@ -24,7 +23,6 @@ class FingerprintreaderTest(Test):
         Test.__init__(self, "fingerprintreader")
         self.interactive = True
         self.priority = 5 # medium
-        self.release = EuroLinuxRelease()
         self.reader = None
         self.bus = None
         self.proxy = None
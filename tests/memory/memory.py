@@ -27,6 +27,7 @@ class MemoryTest(Test):
         Test.__init__(self, "memory")
         self.interactive = False
         self.priority = 5
+        self.resources = ["memory"]
 
     def run(self):
         if not self.run_sub_test(self.get_memory_info, name="Memory limits", description="get test parameters based on hardware"):
@@ -2,15 +2,15 @@
 # Author: Radoslaw Kolba
 #
 
-import sys, time, os, subprocess
+import sys, time, os, subprocess, json
 
-directory = subprocess.getoutput("cat \"/tmp/eohc_workdir\"")
-if directory == "":
-    directory = os.path.abspath('../..')
+# started by systemd after reboot, so find the EOHC directory from this file
+directory = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(directory)
 
-from core.test import Test
+from core.test import Test, TestResult
 from core.lib.continuation import Continuation
+from core.lib.run_journal import RunJournal
 
 class RebootTest(Test):
 
@@ -21,12 +21,20 @@ class RebootTest(Test):
         self.coreCollector = "makedumpfile -d 31"
         self.kdumpConfigPath = "/etc/kdump.conf"
         self.continuation = Continuation()
+        self.cycles = 1 # number of reboots, more than one is a soak test
+        self.drift_limit = 0.2 # boot phases 20% slower at the end than at the beginning are flagged
+        self.cycles_file = "reboot_cycles.json"
 
     def reboot(self):
         print("The system must be restarted for this test")
+        # the boot unit continues the test from this tree after the reboot
+        if os.path.realpath(directory) == "/tmp" or os.path.realpath(directory).startswith("/tmp/"):
+            print("Error: EOHC runs from %s, which may be cleaned at boot - move it out of /tmp" % directory)
+            return False
 
         # set up restart, and log start time
-        self.continuation.set_init_config(self.get_path(), "reboot")
+        command = "%s %s" % (sys.executable, os.path.join(directory, "tests/reboot/reboot.py"))
+        self.continuation.set_init_config(self.get_path(), "reboot", command=command)
 
         # we need a delay here to give hwcert time to finish writing results.xml
         sys.stdout.flush()
@@ -41,22 +49,89 @@ class RebootTest(Test):
         print("Error: shutdown took too long")
         return False
 
+    def load_cycles(self):
+        try:
+            cycles_file = open(self.cycles_file)
+            state = json.load(cycles_file)
+            cycles_file.close()
+            return state
+        except (IOError, OSError, ValueError):
+            return {"cycles": self.cycles, "records": list()}
+
+    def save_cycles(self, state):
+        cycles_file = open(self.cycles_file, "w")
+        json.dump(state, cycles_file, indent=1)
+        cycles_file.close()
+
+    def check_cycles(self, records):
+        """ print the distribution of each boot phase and flag phases which got
+        slower over the cycles """
+        result = True
+        phases = ["duration"]
+        for record in records:
+            for phase in sorted(record["boot"].keys()):
+                if phase not in phases:
+                    phases.append(phase)
+        print("\nBoot times over %u cycles (seconds):" % len(records))
+        for phase in phases:
+            values = list()
+            for record in records:
+                if phase == "duration":
+                    value = record.get("duration")
+                else:
+                    value = record["boot"].get(phase)
+                if value is not None:
+                    values.append(value)
+            if not values:
+                continue
+            ordered = sorted(values)
+            print("    %-16s min %8.3f  median %8.3f  p90 %8.3f  max %8.3f" % (phase, ordered[0],
+                  ordered[len(ordered) // 2], ordered[int(len(ordered) * 0.9)], ordered[-1]))
+            # compare the last third of the cycles with the first third
+            if len(values) < 3:
+                continue
+            third = len(values) // 3
+            first = sorted(values[:third])[third // 2]
+            last = sorted(values[-third:])[third // 2]
+            if first > 0 and last > first * (1 + self.drift_limit):
+                print("Warning: %s drifted from %.3f s to %.3f s" % (phase, first, last))
+                result = "WARN"
+        return result
+
     def run(self):
+        workdir = os.getcwd() + "/"
         if self.continuation.isInitialized():
-            workdir = directory + "/"
-            self.mark_output("Reboot", path=workdir)
+            state = self.load_cycles()
             result = self.continuation.verify(marker=self.get_path())
-            self.mark_summary(result, path=workdir)
+            boot = self.continuation.get_boot_times()
+            state["records"].append({"result": result, "duration": self.continuation.duration,
+                                     "kernel": self.continuation.kernel, "boot": boot})
+            self.save_cycles(state)
+            print("Reboot cycle %u of %u: %s" % (len(state["records"]), state["cycles"], boot))
+            if result and len(state["records"]) < state["cycles"]:
+                return self.reboot()
+
             self.continuation.removeInitConfig()
+            self.mark_output("Reboot", path=workdir)
+            if result:
+                result = self.check_cycles(state["records"])
+            self.mark_summary(result, path=workdir)
             self.close_output(path=workdir)
-            # remove task from crontab
-            subprocess.getoutput("sed -i '$ d' /etc/crontab")
-            subprocess.getoutput("echo \"Reboot test PASSED\" >> %s/eohc.log" % (directory))
+            log = open(workdir + "eohc.log", "a")
+            if result:
+                log.write("Reboot test PASSED\n")
+            else:
+                log.write("Reboot test FAILED\n")
+            log.close()
+            # the runner was restarted by the reboot, record the result for it
+            journal = RunJournal(workdir + "eohc_run.journal")
+            state = journal.load()
+            if state and self.get_path() in state["plan"]:
+                journal.finish_test(self.get_path(), TestResult(result))
+                if not journal.is_complete():
+                    print("Run start_gui.py (or start_headless.py) again to resume the remaining tests")
         else:
-            subprocess.getoutput("pwd > \"/tmp/eohc_workdir\"")
-            filepath = os.path.join(subprocess.getoutput("pwd"), 'tests/reboot/reboot.py')
-            # add one task to crontab
-            subprocess.getoutput("echo \"@reboot root %s\" >> /etc/crontab" % (filepath))
+            self.save_cycles({"cycles": self.cycles, "records": list()})
             result = self.reboot()
 
         return result
@@ -11,7 +11,6 @@ sys.path.append(directory)
 
 from core.lib.devices import get_devices
 from core.test import Test
-from core.release import EuroLinuxRelease
 
 
 class StorageTest(Test):
@@ -20,6 +19,7 @@ class StorageTest(Test):
         Test.__init__(self, "storagetest")
         self.interactive = False
         self.priority = 9 #better to be one of the latests
+        self.resources = ["disk"]
         self.host_pattern_string = "(host|css|cciss|hspa|mmc|nvme|virtio|vbd-)[0-9]+"
         # Min and max blocksizes, in bytes. For each test, we loop through block sizes
         # starting with min_bs and doubling until we hit max_bs. Both should be
@@ -29,7 +29,6 @@ class StorageTest(Test):
         # Maximum size of the test area, in KB. (defaults to 1GB)
         self.max_size = 1048576
         self.file_system_type = "vfat"
-        self.release = EuroLinuxRelease()
         self.test_pkg = "fio"
         # MY
         self.host_name = ""
@@ -494,7 +493,7 @@ class StorageTest(Test):
         options = "--filename=%s --size=%sk --bs=%s" \
                   % (options_dict.get("test_file"), options_dict.get("size"), options_dict.get("max_bs"))
 
-        parameters = "--ioengine=libaio --numjobs=4 --runtime=60 --time_based --group_reporting --eta-newline=1"
+        parameters = "--ioengine=libaio --numjobs=4 --runtime=60 --time_based --group_reporting --eta=always --eta-newline=1"
         direct_param = ""
         if is_direct:
             direct_param = "--direct=1"
@@ -507,7 +506,16 @@ class StorageTest(Test):
         try:
             print("Executing the fio command: %s" % command)
             sys.stdout.flush()
-            print(subprocess.getoutput(command))
+            fio = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   universal_newlines=True, errors="replace")
+            for line in fio.stdout:
+                print(line.rstrip("\n"))
+                # eta lines: "Jobs: 4 (f=4): [m(4)][10.0%][r=120MiB/s,w=118MiB/s][r=30.1k,w=29.5k IOPS]..."
+                match = re.search(r"\[r=(?P<read>[\d\.]+[kMG]?i?B/s),w=(?P<write>[\d\.]+[kMG]?i?B/s)\]", line)
+                if match:
+                    self.report_metric("fio read", match.group("read"))
+                    self.report_metric("fio write", match.group("write"))
+            fio.wait()
         except Exception as e:
             print("Error: Failed to excute the fio command !!")
             print(e)
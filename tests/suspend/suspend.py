@@ -2,16 +2,16 @@
 # Author: Radoslaw Kolba
 #
 
-import os, sys, time, syslog
+import os, re, sys, time, subprocess
 
 directory = os.path.abspath('../..')
 sys.path.append(directory)
 
 from core.test import Test
-from core.release import EuroLinuxRelease
 from core.controller import Controller
 from core.lib.command_line import prompt_confirm
 from core.lib.devices import get_devices
+from core.lib.kmsg import read_kernel_log, get_kernel_log_sequence
 
 
 # from rhcert.tags import Constants
@@ -20,7 +20,6 @@ class SuspendTest(Test):
 
     def __init__(self):
         Test.__init__(self, "suspend")
-        self.release = EuroLinuxRelease()
         self.hwcert_controller = Controller()
         self.interactive = True
         self.priority = 5 # medium
@@ -41,6 +40,44 @@ class SuspendTest(Test):
             self.known_methods.append("freeze")
             self.suspend_message["freeze"] = "Starting Freeze"
             self.state_message["freeze"] = ["PM: suspend entry (s2idle)", "PM: Entering freeze sleep"]
+        # Unattended suspend/resume cycles woken up by the RTC alarm
+        self.rtcwake_cycles = 5
+        self.rtcwake_seconds = 15
+        self.wakealarm_file_path = "/sys/class/rtc/rtc0/wakealarm"
+        self.slow_resume_factor = 2.0 # resume slower than 2x the median is flagged
+        self.suspend_stats = None
+        self.kernel_log_sequence = None
+        self.cycle_timings = list()
+        # Kernel messages marking the suspend/resume milestones, first match wins
+        self.suspend_milestones = [
+            ("start", ["PM: suspend entry", "PM: hibernation entry", "PM: hibernation: hibernation entry",
+                       "PM: Syncing filesystems", "Filesystems sync"]),
+            ("frozen", ["Freezing remaining freezable tasks completed",
+                        "Freezing remaining freezable tasks ... (elapsed"]),
+            ("sleep", ["Disabling non-boot CPUs", "Preparing to enter system sleep state",
+                       "PM: suspend-to-idle", "PM: Creating hibernation image"]),
+            ("wake", ["Enabling non-boot CPUs", "Waking up from system sleep state",
+                      "PM: resume from suspend-to-idle", "PM: Image restored"]),
+            ("tasks restarted", ["Restarting tasks"]),
+        ]
+        # phase: (first milestone, last milestone)
+        self.suspend_phases = [
+            ("suspend entry", "start", "frozen"),
+            ("device suspend", "frozen", "sleep"),
+            ("resume", "wake", "tasks restarted"),
+        ]
+        # Per device callback times printed by the kernel with pm_print_times
+        self.pm_print_times_file_path = "/sys/power/pm_print_times"
+        self.pm_debug_messages_file_path = "/sys/power/pm_debug_messages"
+        self.pm_debug_defaults = dict()
+        self.device_time_patterns = [
+            # "pci 0000:00:14.0: pci_pm_resume+0x0/0x90 returned 0 after 1234 usecs"
+            re.compile("^(?P<device>.+?): \\S+ returned (?P<error>-?\\d+) after (?P<usecs>\\d+) usecs"),
+            # older kernels: "call 0000:00:14.0+ returned 0 after 1234 usecs"
+            re.compile("^call (?P<device>\\S+)\\+ returned (?P<error>-?\\d+) after (?P<usecs>\\d+) usecs"),
+        ]
+        self.top_offenders = 5
+        self.device_timings = list()
 
     def plan(self):
         tests = list()
@@ -90,13 +127,54 @@ class SuspendTest(Test):
             return False
         return True
 
+    def is_rtcwake_supported(self):
+        if not os.path.exists(self.wakealarm_file_path):
+            return False
+        return subprocess.getstatusoutput("rtcwake -V")[0] == 0
+
+    def get_suspend_stats(self):
+        """ returns the kernel suspend statistics as a dictionary of integers
+        or None if they are not available """
+        stats = dict()
+        stats_directory = "/sys/power/suspend_stats"
+        if os.path.isdir(stats_directory):
+            for name in os.listdir(stats_directory):
+                try:
+                    stats[name] = int(open(os.path.join(stats_directory, name)).read().strip())
+                except (OSError, ValueError):
+                    continue
+            return stats
+        try:
+            # older kernels: "success: 2", "fail: 0", ... in debugfs
+            for line in open("/sys/kernel/debug/suspend_stats"):
+                pair = line.split(":")
+                if len(pair) == 2 and pair[1].strip().isdigit():
+                    stats[pair[0].strip()] = int(pair[1].strip())
+        except OSError:
+            return None
+        return stats
+
     def suspend(self, source, method):
         print("This test will suspend the operating system.")
-        print("Please resume by pressing the power button after suspend has completed.")
+        if source == "RTCWake":
+            print("The system will be woken up by the RTC alarm.")
+        else:
+            print("Please resume by pressing the power button after suspend has completed.")
         sys.stdout.flush()
         markerName = "%s-%s-%s" % (self.get_path(), source, method)
-        syslog.syslog(self.hwcert_controller.get_system_log_marker(markerName, "begin"))
-        if source == "OSCommand":
+        self.hwcert_controller.mark_system_log(markerName, "begin")
+        self.suspend_stats = self.get_suspend_stats()
+        self.kernel_log_sequence = get_kernel_log_sequence()
+        if source == "RTCWake":
+            print("Setting RTC wake alarm in %u sec" % self.rtcwake_seconds)
+            rtcwake = subprocess.getstatusoutput("rtcwake -m no -s %u" % self.rtcwake_seconds)
+            if rtcwake[0] != 0:
+                print("Error: could not set the RTC wake alarm")
+                print(rtcwake[1])
+                return False
+            # the write to /sys/power/state returns after resume
+            return self.suspend_without_os_command(method)
+        elif source == "OSCommand":
             if not prompt_confirm(" suspend? "):
                 return False
             waitTime = 5
@@ -118,15 +196,52 @@ class SuspendTest(Test):
             return False
 
     # Resume
+    def wait_for_resume(self, method, timeout=300):
+        """ wait until the kernel counts another suspend in its statistics.
+        returns False when this can not be detected """
+        if self.suspend_stats is None or method == "disk":
+            # hibernation is not counted in suspend statistics
+            return False
+        print("Waiting for suspend and resume...")
+        sys.stdout.flush()
+        slept = 0
+        while slept < timeout:
+            stats = self.get_suspend_stats() or dict()
+            for counter in ["success", "fail"]:
+                if stats.get(counter, 0) > self.suspend_stats.get(counter, 0):
+                    return True
+            time.sleep(1)
+            slept += 1
+        print("Warning: no resume detected within %u sec" % timeout)
+        return False
+
     def check_resume(self, source, method):
         self.verified_resume_method = None
         sys.stdout.flush()
-        prompt_confirm("Has resume completed? ")
+        # writes to /sys/power/state return after resume, only
+        # a function key suspend has to be waited for
+        if source == "FunctionKey" and not self.wait_for_resume(method):
+            prompt_confirm("Has resume completed? ")
         markerName = "%s-%s-%s" % (self.get_path(), source, method)
-        syslog.syslog(self.hwcert_controller.get_system_log_marker(markerName, "end"))
+        self.hwcert_controller.mark_system_log(markerName, "end")
 
         # get system log path
         log = self.hwcert_controller.get_system_log("%s-%s-%s" % (self.get_path(), source, method))
+        # kernel messages since suspend, if the kernel log is readable
+        records = None
+        if self.kernel_log_sequence is not None:
+            records = read_kernel_log(since=self.kernel_log_sequence)
+        if records:
+            kernel_log = "\n".join([message for (seq, usec, message) in records])
+        else:
+            kernel_log = log
+
+        if self.suspend_stats is not None and method != "disk":
+            stats = self.get_suspend_stats() or dict()
+            if stats.get("fail", 0) > self.suspend_stats.get("fail", 0):
+                print("Error: kernel reported a failed suspend (last failed device: %s)"
+                      % self.get_last_failed_device())
+                return False
 
         if source == "FunctionKey":
             try:
@@ -140,13 +255,13 @@ class SuspendTest(Test):
 
         # check suspend/hibernate/freeze message (given by kernel)
         suspend_message = "Freezing user space processes"
-        if not suspend_message in log:
+        if not suspend_message in kernel_log:
             print("Error: could not verify suspend")
             return False
 
         print("Verified suspend")
         resume_message = "Restarting tasks"
-        if not resume_message in log:
+        if not resume_message in kernel_log:
             print("Error: could not verify resume")
             return False
 
@@ -154,7 +269,7 @@ class SuspendTest(Test):
         for state in self.state_message.keys():
             method_messages = self.state_message[state]
             for method_message in method_messages:
-                if method_message in log:
+                if method_message in kernel_log:
                     self.verified_resume_method = state
                     print("Found '%s' in log messages" % method_message)
                     break
@@ -169,8 +284,149 @@ class SuspendTest(Test):
             return False
 
         print("Verified resume from %s" % self.verified_resume_method)
+        if records:
+            timings = self.get_suspend_timings(records)
+            self.cycle_timings.append(timings)
+            for (phase, first, last) in self.suspend_phases:
+                if phase in timings:
+                    print("    %s: %.1f ms" % (phase, timings[phase]))
+            # kernel summaries: "PM: resume devices took 0.123 seconds"
+            for (seq, usec, message) in records:
+                if "devices took" in message or "of devices complete after" in message:
+                    print("    " + message)
+            device_timings = self.get_device_timings(records)
+            self.device_timings.append(device_timings)
+            self.print_top_offenders(device_timings)
         return True
 
+    def set_pm_print_times(self, enable):
+        """ make the kernel log the time of every device suspend/resume
+        callback; disabling restores the previous settings """
+        for path in [self.pm_print_times_file_path, self.pm_debug_messages_file_path]:
+            try:
+                if enable:
+                    self.pm_debug_defaults[path] = open(path).read().strip()
+                    value = "1"
+                elif path in self.pm_debug_defaults:
+                    value = self.pm_debug_defaults.pop(path)
+                else:
+                    continue
+                sys_power_file = open(path, "w")
+                sys_power_file.write(value)
+                sys_power_file.close()
+            except (OSError, IOError):
+                if enable and path == self.pm_print_times_file_path:
+                    print("Warning: could not enable %s, no per device timings" % path)
+
+    def get_device_timings(self, records):
+        """ returns {"suspend": {device: usecs}, "resume": {device: usecs}},
+        summing all callbacks of a device. Callbacks logged after the system
+        woke up count as resume """
+        device_timings = {"suspend": dict(), "resume": dict()}
+        wake_messages = dict(self.suspend_milestones)["wake"]
+        phase = "suspend"
+        for (seq, usec, message) in records:
+            if phase == "suspend":
+                for wake_message in wake_messages:
+                    if wake_message in message:
+                        phase = "resume"
+                        break
+            for pattern in self.device_time_patterns:
+                match = pattern.search(message)
+                if match:
+                    device = match.group("device")
+                    device_timings[phase][device] = device_timings[phase].get(device, 0) + int(match.group("usecs"))
+                    if match.group("error") != "0":
+                        print("Warning: %s returned %s during %s" % (device, match.group("error"), phase))
+                    break
+        return device_timings
+
+    def print_top_offenders(self, device_timings):
+        for phase in ["suspend", "resume"]:
+            devices = sorted(device_timings[phase].items(), key=lambda item: item[1], reverse=True)
+            if not devices:
+                continue
+            print("    slowest devices during %s:" % phase)
+            for (device, usecs) in devices[:self.top_offenders]:
+                print("        %-40s %10.1f ms" % (device, usecs / 1000.0))
+
+    def print_device_histograms(self):
+        """ histogram of per cycle times of the slowest devices over all cycles """
+        buckets = [(1, "<1 ms"), (10, "1-10 ms"), (100, "10-100 ms"), (1000, "100 ms-1 s"), (None, ">1 s")]
+        for phase in ["suspend", "resume"]:
+            totals = dict()
+            for device_timings in self.device_timings:
+                for (device, usecs) in device_timings[phase].items():
+                    totals[device] = totals.get(device, 0) + usecs
+            if not totals:
+                continue
+            print("Slowest devices during %s over %u cycles:" % (phase, len(self.device_timings)))
+            for (device, total) in sorted(totals.items(), key=lambda item: item[1], reverse=True)[:self.top_offenders]:
+                counts = [0] * len(buckets)
+                for device_timings in self.device_timings:
+                    msecs = device_timings[phase].get(device, 0) / 1000.0
+                    for (index, (limit, label)) in enumerate(buckets):
+                        if limit is None or msecs < limit:
+                            counts[index] += 1
+                            break
+                histogram = ", ".join(["%s: %u" % (label, count) for ((limit, label), count) in zip(buckets, counts) if count])
+                print("    %-40s total %10.1f ms  [%s]" % (device, total / 1000.0, histogram))
+
+    def get_last_failed_device(self):
+        try:
+            return open("/sys/power/suspend_stats/last_failed_dev").read().strip()
+        except OSError:
+            return "unknown"
+
+    def get_suspend_timings(self, records):
+        """ returns the duration of each suspend phase in ms, measured
+        between the kernel log timestamps of the phase milestones """
+        milestones = dict()
+        for (seq, usec, message) in records:
+            for (milestone, messages) in self.suspend_milestones:
+                if milestone in milestones:
+                    continue
+                for milestone_message in messages:
+                    if milestone_message in message:
+                        milestones[milestone] = usec
+                        break
+        timings = dict()
+        for (phase, first, last) in self.suspend_phases:
+            if first in milestones and last in milestones:
+                timings[phase] = (milestones[last] - milestones[first]) / 1000.0
+        return timings
+
+    def check_cycle_timings(self):
+        """ summarize the phase timings of all cycles and flag slow resumes """
+        result = True
+        for (phase, first, last) in self.suspend_phases:
+            values = [timings[phase] for timings in self.cycle_timings if phase in timings]
+            if not values:
+                print("Warning: could not measure %s time" % phase)
+                continue
+            median = sorted(values)[len(values) // 2]
+            print("%s: min %.1f ms, median %.1f ms, max %.1f ms over %u cycles"
+                  % (phase, min(values), median, max(values), len(values)))
+            if phase != "resume" or len(values) < 3:
+                continue
+            for (cycle, timings) in enumerate(self.cycle_timings, 1):
+                if timings.get(phase, 0) > median * self.slow_resume_factor:
+                    print("Warning: slow resume in cycle %u: %.1f ms (median %.1f ms)"
+                          % (cycle, timings[phase], median))
+                    result = "WARN"
+        return result
+
+    def run_rtcwake_cycles(self, method):
+        self.cycle_timings = list()
+        self.device_timings = list()
+        for cycle in range(1, self.rtcwake_cycles + 1):
+            print("\nSuspend/resume cycle %u of %u" % (cycle, self.rtcwake_cycles))
+            if not self.run_suspend_resume("RTCWake", method):
+                print("Error: cycle %u failed" % cycle)
+                return False
+        self.print_device_histograms()
+        return self.check_cycle_timings()
+
     def reset_mem_sleep_to_default(self):
         if self.need_to_reset_mem_sleep_to_default:
             self.need_to_reset_mem_sleep_to_default = False if \
@@ -194,17 +450,30 @@ class SuspendTest(Test):
         if not methods:
             return False
         result = True
-        for source in ["OSCommand", "FunctionKey"]:
-            for method in methods:
-                self.mark_output(name="Suspend " + source + "-" + method)
-                if not self.run_suspend_resume(source, method):
-                    result = False
-                    self.mark_summary("FAIL")
-                elif self.verified_resume_method != method:
-                    result = False
-                    self.mark_summary("FAIL")
-                else:
-                    self.mark_summary("PASS")
+        # the RTC alarm replaces the manual resume when it is available
+        sources = ["OSCommand", "FunctionKey"]
+        if self.is_rtcwake_supported():
+            sources[0] = "RTCWake"
+        self.set_pm_print_times(True)
+        try:
+            for source in sources:
+                for method in methods:
+                    self.mark_output(name="Suspend " + source + "-" + method)
+                    if source == "RTCWake":
+                        status = self.run_rtcwake_cycles(method)
+                    else:
+                        status = self.run_suspend_resume(source, method)
+                    if not status:
+                        result = False
+                        self.mark_summary("FAIL")
+                    elif self.verified_resume_method != method:
+                        result = False
+                        self.mark_summary("FAIL")
+                    else:
+                        self.mark_summary(status)
+        finally:
+            # also after an exception or interrupt, so the debug settings do not stay on
+            self.set_pm_print_times(False)
         self.close_output()
         if result:
             print("Suspend test PASSED")
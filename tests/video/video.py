@@ -20,7 +20,6 @@ import os, re, sys, platform, signal, time, io, subprocess
 directory = os.path.abspath('../..')
 sys.path.append(directory)
 
-from core.release import EuroLinuxRelease
 from core.test import Test
 from core.lib.devices import get_devices
 
@@ -33,7 +32,6 @@ class VideoTest(Test):
         self.Xconfig_flag = ""
         self.depth = 0
         self.Xconfigfile = "/tmp/hwcertXconfig"
-        self.release = EuroLinuxRelease()
         self.display = "0"
         self.device = None
         if self.release.get_version() > 8 and os.environ.get('DISPLAY'):
@@ -8,6 +8,8 @@ directory = os.path.abspath('../..')
 sys.path.append(directory)
 
 from core.lib.network import NetworkTest, Wireless
+from core.lib.netlink import wait_for_address
+from core.lib.wlan import WlanBenchmark
 
 
 class WlanTest(NetworkTest):
@@ -23,12 +25,19 @@ class WlanTest(NetworkTest):
         self.interface_connect = "nmcli dev connect"
         self.interactive = False
         self.priority = 2 # set priority high so it runs before longer tests
+        self.resources = ["network"]
         self.device = None
         self.logical_device_name = ""
+        # throughput and latency against signal and MCS, e.g. "parameters": {"wlan": {"benchmark": true}}
+        self.benchmark = False
+        self.benchmark_duration = 20 # seconds of each direction
+        # NetworkManager connections to benchmark one after another, e.g. one access point
+        # per band (2.4/5/6 GHz) - the current connection if empty
+        self.benchmark_connections = list()
 
     def get_required_rpms(self):
         install = ' '.join(NetworkTest.get_required_rpms(self))
-        install = install + " rfkill"
+        install = install + " iw"
         return install.split(' ')
 
     def plan(self):
@@ -54,6 +63,7 @@ class WlanTest(NetworkTest):
                         test.device = device
                         test.logical_device_name = logical_device
                         tests.append(test)
+        self.set_planned_interfaces(tests)
         return tests
 
     def is_best_type(self, supported_types):
@@ -117,6 +127,47 @@ class WlanTest(NetworkTest):
                 return False
         return True
 
+    def get_extra_sub_tests(self):
+        if self.benchmark:
+            # switching between benchmark_connections takes the link down
+            expected_kernel_log = ("link_down",) if self.benchmark_connections else ()
+            return [(self.benchmark_links, "Wireless benchmark", "throughput and latency against signal and MCS",
+                     expected_kernel_log)]
+        return list()
+
+    # 5. Measures every benchmark connection
+    def benchmark_links(self):
+        original = subprocess.getoutput("nmcli -g GENERAL.CONNECTION device show %s" % self.logical_device_name).strip()
+        result = True
+        for connection in self.benchmark_connections or [None]:
+            if connection:
+                print("\nConnecting %s to %s" % (self.logical_device_name, connection))
+                if subprocess.getstatusoutput("nmcli conn up '%s' ifname %s" % (connection, self.logical_device_name))[0] != 0 \
+                        or not wait_for_address(self.logical_device_name, 30):
+                    print("Error: could not connect to %s" % connection)
+                    result = False
+                    continue
+            ports = range(NetworkTest.iperf_port, NetworkTest.iperf_port + int(self.no_proc))
+            benchmark = WlanBenchmark(self.logical_device_name, self.test_server, ports, duration=self.benchmark_duration)
+            if not benchmark.run():
+                result = False
+                continue
+            benchmark.print_report()
+            link = benchmark.get_link()
+            for measurement in benchmark.results:
+                self.report_metric("WLAN %s %s" % (link["band"], measurement["direction"]),
+                                   round(measurement["throughput"], 1), "Mb/s")
+            warnings = benchmark.get_warnings(self.required_support)
+            for warning in warnings:
+                print("Warning: %s" % warning)
+            if warnings and result is True:
+                result = "WARN"
+        if self.benchmark_connections and original and original != "--":
+            print("\nReconnecting %s to %s" % (self.logical_device_name, original))
+            subprocess.getoutput("nmcli conn up '%s' ifname %s" % (original, self.logical_device_name))
+            wait_for_address(self.logical_device_name, 30)
+        return result
+
     # 4. Should provide information about support
     def checkSupport(self):
         wireless = Wireless()